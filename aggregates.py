@@ -0,0 +1,79 @@
+PRICE_BUCKETS = (
+    ('under_10k', 10000),
+    ('10k_50k', 50000),
+    ('50k_100k', 100000),
+    ('above_100k', None)
+)
+
+
+def price_bucket(price_value):
+    """Name of the /api/stats price bucket a numeric price falls into"""
+    if price_value is None:
+        return None
+    for name, upper in PRICE_BUCKETS:
+        if upper is None or price_value < upper:
+            return name
+
+
+def _bump(counts, key, delta):
+    count = counts.get(key, 0) + delta
+    if count:
+        counts[key] = count
+    else:
+        counts.pop(key, None)
+
+
+class Aggregates:
+    """Category, source and price-bucket counts, kept up to date as products come and go"""
+
+    def __init__(self, products=()):
+        self.total = 0
+        self.category_counts = {}
+        self.source_counts = {}
+        self.price_ranges = {name: 0 for name, _ in PRICE_BUCKETS}
+        self._categories = None
+        for product in products:
+            self.add(product)
+
+    @property
+    def categories(self):
+        """Sorted category names, recomputed only when the set of categories changes"""
+        if self._categories is None:
+            self._categories = sorted(self.category_counts)
+        return self._categories
+
+    def _update(self, product, delta):
+        self.total += delta
+        category = product.category
+        known = category in self.category_counts
+        _bump(self.category_counts, category, delta)
+        if known != (category in self.category_counts):
+            self._categories = None
+        _bump(self.source_counts, product.source, delta)
+        bucket = price_bucket(product.price_value)
+        if bucket:
+            self.price_ranges[bucket] += delta
+
+    def add(self, product):
+        self._update(product, 1)
+
+    def remove(self, product):
+        self._update(product, -1)
+
+    def copy(self):
+        clone = Aggregates()
+        clone.total = self.total
+        clone.category_counts = dict(self.category_counts)
+        clone.source_counts = dict(self.source_counts)
+        clone.price_ranges = dict(self.price_ranges)
+        clone._categories = self._categories
+        return clone
+
+    def apply(self, added=(), removed=()):
+        """New aggregates with the given products added and removed, leaving this one untouched"""
+        updated = self.copy()
+        for product in removed:
+            updated.remove(product)
+        for product in added:
+            updated.add(product)
+        return updated
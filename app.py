@@ -1,14 +1,25 @@
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, g, jsonify, request, render_template_string
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
-import json
+import math
 import re
 from datetime import datetime
 import time
-import random
-from urllib.parse import urljoin, urlparse
 import logging
+import os
+import io
+import gzip
+from scraper import ScrapeEngine
+from sources import SourceAdapter, SourceRegistry
+from snapshot import SnapshotStore, SnapshotDiff, RefreshScheduler
+from ingest import dedupe_products, ingest_products
+from response_cache import ResponseCache, gzip_etag, make_etag
+from query_cache import QueryCache
+from metrics import MetricsRegistry
+from pagination import decode_cursor, paginate, iter_ndjson, iter_json_array
+from facets import bitmap_positions, to_bitmap
+from aggregates import PRICE_BUCKETS
+from persistence import SnapshotDatabase
+from bulk import IMPORT_FORMATS, IMPORT_MODES, ImportedCatalogue, ImportTooLarge, export_feed, import_feed
 
 app = Flask(__name__)
 CORS(app)  
@@ -16,12 +27,57 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-products_cache = []
-last_updated = None
+snapshot_store = SnapshotStore()
+
+MAX_BATCH_IDS = 500
+
+PRICE_BUCKET_NAMES = tuple(name for name, _ in PRICE_BUCKETS)
+
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', 30))
+
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_BYTES', 32 * 1024 * 1024)),
+    compress=os.environ.get('RESPONSE_CACHE_GZIP', '1') == '1'
+)
+snapshot_store.subscribe(lambda snapshot: response_cache.clear())
+
+query_cache = QueryCache(
+    max_entries=int(os.environ.get('QUERY_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('QUERY_CACHE_TTL', 300))
+)
+snapshot_store.subscribe(lambda snapshot: query_cache.clear())
+
+metrics_registry = MetricsRegistry()
+filter_seconds = metrics_registry.histogram(
+    'product_filter_seconds', 'Time to filter and rank products on a query cache miss')
+serialize_seconds = metrics_registry.histogram(
+    'response_serialize_seconds', 'Time to serialize and gzip a response body on a response cache miss')
+
+SNAPSHOT_DB = os.environ.get('SNAPSHOT_DB', 'data/products.db')
+snapshot_db = SnapshotDatabase(SNAPSHOT_DB) if SNAPSHOT_DB else None
+if snapshot_db:
+    snapshot_store.subscribe(snapshot_db.save)
+
+imported_catalogue = ImportedCatalogue(snapshot_db)
+
+# POST /api/import stays disabled until a token is set
+IMPORT_TOKEN = os.environ.get('IMPORT_TOKEN', '')
+IMPORT_BUFFER_BYTES = 1024 * 1024
+IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', 1024 * 1024 * 1024))
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 1000000))
+
+scrape_engine = ScrapeEngine(
+    max_workers=int(os.environ.get('SCRAPE_WORKERS', 8)),
+    rate=float(os.environ.get('SCRAPE_RATE_PER_HOST', 0.5)),
+    timeout=float(os.environ.get('SCRAPE_TIMEOUT', 10)),
+    retries=int(os.environ.get('SCRAPE_RETRIES', 2))
+)
+
+HTML_PARSER = os.environ.get('HTML_PARSER', 'lxml')
+PARSE_PROCESSES = int(os.environ.get('PARSE_PROCESSES', 0))
 
 FALLBACK_DATA = [
     {
-        "id": 1,
         "title": "iPhone 15 Pro Max",
         "description": "Latest flagship smartphone with titanium design, A17 Pro chip, and advanced camera system.",
         "price": "AED 1,59,900",
@@ -30,7 +86,6 @@ FALLBACK_DATA = [
         "source": "Apple Store"
     },
     {
-        "id": 2,
         "title": "Samsung Galaxy S24 Ultra",
         "description": "Premium Android smartphone with S Pen, 200MP camera, and AI-powered features.",
         "price": "AED 1,29,999",
@@ -39,7 +94,6 @@ FALLBACK_DATA = [
         "source": "Samsung"
     },
     {
-        "id": 3,
         "title": "MacBook Pro 16\" M3 Max",
         "description": "Professional laptop with M3 Max chip, 18-hour battery life, and stunning Liquid Retina XDR display.",
         "price": "AED 3,99,900",
@@ -48,7 +102,6 @@ FALLBACK_DATA = [
         "source": "Apple Store"
     },
     {
-        "id": 4,
         "title": "Dell XPS 13 Plus",
         "description": "Ultrabook with 13th Gen Intel Core processors, premium build quality, and edge-to-edge display.",
         "price": "AED 1,54,990",
@@ -57,7 +110,6 @@ FALLBACK_DATA = [
         "source": "Dell"
     },
     {
-        "id": 5,
         "title": "Sony WH-1000XM5",
         "description": "Industry-leading noise canceling headphones with 30-hour battery life and crystal-clear calls.",
         "price": "AED 29,990",
@@ -66,7 +118,6 @@ FALLBACK_DATA = [
         "source": "Sony"
     },
     {
-        "id": 6,
         "title": "AirPods Pro (2nd Gen)",
         "description": "Wireless earbuds with active noise cancellation, spatial audio, and adaptive transparency.",
         "price": "AED 26,900",
@@ -75,7 +126,6 @@ FALLBACK_DATA = [
         "source": "Apple Store"
     },
     {
-        "id": 7,
         "title": "NVIDIA RTX 4090",
         "description": "Ultimate gaming graphics card with 24GB GDDR6X memory and ray tracing capabilities.",
         "price": "AED 1,54,000",
@@ -84,7 +134,6 @@ FALLBACK_DATA = [
         "source": "NVIDIA"
     },
     {
-        "id": 8,
         "title": "PlayStation 5",
         "description": "Next-gen gaming console with ultra-high speed SSD, ray tracing, and 4K gaming support.",
         "price": "AED 54,990",
@@ -93,7 +142,6 @@ FALLBACK_DATA = [
         "source": "PlayStation"
     },
     {
-        "id": 9,
         "title": "iPad Pro 12.9\" M2",
         "description": "Professional tablet with M2 chip, Liquid Retina XDR display, and Apple Pencil support.",
         "price": "AED 1,12,900",
@@ -102,7 +150,6 @@ FALLBACK_DATA = [
         "source": "Apple Store"
     },
     {
-        "id": 10,
         "title": "Microsoft Surface Pro 9",
         "description": "2-in-1 laptop tablet with 12th Gen Intel Core processors and all-day battery life.",
         "price": "AED 1,13,999",
@@ -111,7 +158,6 @@ FALLBACK_DATA = [
         "source": "Microsoft"
     },
     {
-        "id": 11,
         "title": "Google Pixel 8 Pro",
         "description": "AI-powered smartphone with advanced computational photography and 7 years of updates.",
         "price": "AED 1,06,999",
@@ -120,7 +166,6 @@ FALLBACK_DATA = [
         "source": "Google Store"
     },
     {
-        "id": 12,
         "title": "OnePlus 12",
         "description": "Flagship killer with Snapdragon 8 Gen 3, 120W fast charging, and Hasselblad camera.",
         "price": "AED 64,999",
@@ -129,7 +174,6 @@ FALLBACK_DATA = [
         "source": "OnePlus"
     },
     {
-        "id": 13,
         "title": "ASUS ROG Zephyrus G16",
         "description": "Gaming laptop with RTX 4070, AMD Ryzen 9 processor, and 240Hz display.",
         "price": "AED 1,89,990",
@@ -138,7 +182,6 @@ FALLBACK_DATA = [
         "source": "ASUS"
     },
     {
-        "id": 14,
         "title": "Bose QuietComfort 45",
         "description": "Premium noise-cancelling headphones with 24-hour battery and balanced sound signature.",
         "price": "AED 32,900",
@@ -147,7 +190,6 @@ FALLBACK_DATA = [
         "source": "Bose"
     },
     {
-        "id": 15,
         "title": "Logitech MX Master 3S",
         "description": "Advanced wireless mouse with ultra-precise scroll wheel and multi-device connectivity.",
         "price": "AED 8,995",
@@ -156,7 +198,6 @@ FALLBACK_DATA = [
         "source": "Logitech"
     },
     {
-        "id": 16,
         "title": "Samsung 32\" Odyssey G7",
         "description": "1000R curved gaming monitor with 240Hz refresh rate and 1ms response time.",
         "price": "AED 54,999",
@@ -165,7 +206,6 @@ FALLBACK_DATA = [
         "source": "Samsung"
     },
     {
-        "id": 17,
         "title": "Apple Magic Keyboard",
         "description": "Wireless keyboard with scissor mechanism, numeric keypad, and rechargeable battery.",
         "price": "AED 19,900",
@@ -174,7 +214,6 @@ FALLBACK_DATA = [
         "source": "Apple Store"
     },
     {
-        "id": 18,
         "title": "ThinkPad X1 Carbon Gen 11",
         "description": "Business ultrabook with 13th Gen Intel Core, carbon fiber construction, and military-grade durability.",
         "price": "AED 1,89,000",
@@ -183,7 +222,6 @@ FALLBACK_DATA = [
         "source": "Lenovo"
     },
     {
-        "id": 19,
         "title": "Razer DeathAdder V3",
         "description": "Ergonomic gaming mouse with 30K DPI sensor, 90-hour battery life, and ultra-lightweight design.",
         "price": "AED 8,999",
@@ -192,7 +230,6 @@ FALLBACK_DATA = [
         "source": "Razer"
     },
     {
-        "id": 20,
         "title": "JBL Flip 6",
         "description": "Portable Bluetooth speaker with powerful sound, 12-hour playtime, and IP67 waterproof rating.",
         "price": "AED 11,999",
@@ -202,18 +239,23 @@ FALLBACK_DATA = [
     }
 ]
 
-def safe_request(url, timeout=10):
-    """Make a safe HTTP request with error handling"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed for {url}: {e}")
-        return None
+FALLBACK_PRODUCTS = ingest_products(FALLBACK_DATA)
+
+source_registry = SourceRegistry()
+source_registry.register(SourceAdapter(
+    'flipkart-smartphone',
+    urls='https://www.flipkart.com/search?q=smartphone',
+    parser='flipkart',
+    category='smartphone',
+    refresh_interval=float(os.environ.get('FLIPKART_REFRESH_INTERVAL', 3600))
+))
+source_registry.register(SourceAdapter(
+    'amazon-laptop',
+    urls='https://www.amazon.in/s?k=laptop',
+    parser='amazon',
+    category='laptop',
+    refresh_interval=float(os.environ.get('AMAZON_REFRESH_INTERVAL', 3600))
+))
 
 def extract_price(text):
     """Extract price from text using regex"""
@@ -231,89 +273,494 @@ def extract_price(text):
             return match.group(0)
     return "Price not available"
 
-def scrape_tech_products():
-    """Enhanced scraping function with real web scraping capability"""
-    scraped_products = []
-    
-    sources = [
-        {
-            'url': 'https://www.flipkart.com/search?q=smartphone',
-            'type': 'flipkart',
-            'category': 'smartphone'
-        },
-        {
-            'url': 'https://www.amazon.in/s?k=laptop',
-            'type': 'amazon',
-            'category': 'laptop'
-        }
-    ]
-    
+def scrape_tech_products(force=False):
+    """Refresh due sources and merge their products with the imported ones, or return None when nothing changed"""
     try:
-        for source in sources:
-            response = safe_request(source['url'])
-            if response:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                if source['type'] == 'flipkart':
-                    products = soup.find_all('div', {'data-id': True})[:5]  # Limit to 5 per source
-                    for i, product in enumerate(products):
-                        try:
-                            title = product.find('a', class_='IRpwTa')
-                            price = product.find('div', class_='_30jeq3')
-                            if title and price:
-                                scraped_products.append({
-                                    'id': len(scraped_products) + 1,
-                                    'title': title.text.strip()[:50] + '...',
-                                    'description': f"Popular {source['category']} from Flipkart",
-                                    'price': price.text.strip(),
-                                    'category': source['category'],
-                                    'link': 'https://www.flipkart.com' + title.get('href', ''),
-                                    'source': 'Flipkart',
-                                    'scraped_at': datetime.now().isoformat()
-                                })
-                        except:
-                            continue
-                
-                time.sleep(2)
+        changed = source_registry.refresh(scrape_engine, force=force, processes=PARSE_PROCESSES, parser=HTML_PARSER)
+        imports_changed = imported_catalogue.sync()
+        if not changed and not imports_changed and snapshot_store.current.version:
+            return None
+        scraped_products = source_registry.products()
+        if not scraped_products and snapshot_store.current.version:
+            # Nothing fetched since this process started (e.g. a warm start with the sites down):
+            # keep the scraped products the current snapshot was built from instead of fallback data
+            scraped_products = imported_catalogue.last_scraped()
         
         if len(scraped_products) < 10:
             logger.warning("Insufficient scraped data, using fallback data")
-            scraped_products.extend(FALLBACK_DATA[:15])
+            scraped_products = dedupe_products(scraped_products + FALLBACK_PRODUCTS[:15])
         
     except Exception as e:
         logger.error(f"Error during scraping: {e}")
-        scraped_products = FALLBACK_DATA
+        scraped_products = list(FALLBACK_PRODUCTS)
     
-    return scraped_products[:20]  
+    scraped_products = imported_catalogue.merge(scraped_products[:20])
+    current = snapshot_store.current
+    if (current.version and [p.id for p in current.products] == [p.id for p in scraped_products]
+            and not SnapshotDiff.between(current.by_id, {p.id: p for p in scraped_products})):
+        logger.info("Scraped catalogue is unchanged, keeping the current snapshot")
+        return None
+    return scraped_products
+
+REFRESH_INTERVAL = float(os.environ.get('REFRESH_INTERVAL', 3600))
+
+refresher = RefreshScheduler(snapshot_store, scrape_tech_products, interval=REFRESH_INTERVAL)
 
 def initialize_products():
     """Initialize products cache with fresh data"""
-    global products_cache, last_updated
-    
     logger.info("Initializing products cache...")
-    products_cache = scrape_tech_products()
-    last_updated = datetime.now()
-    logger.info(f"Loaded {len(products_cache)} products")
+    snapshot = snapshot_store.publish(scrape_tech_products(force=True))
+    logger.info(f"Loaded {len(snapshot)} products")
+
+def warm_start():
+    """Serve the last persisted snapshot straight away and refresh it in the background"""
+    stored = snapshot_db.load() if snapshot_db else None
+    if stored is None:
+        initialize_products()
+        return False
+    
+    version, published_at, products = stored
+    snapshot = snapshot_store.publish(products, last_updated=published_at, version=version)
+    logger.info(f"Warm start from snapshot v{snapshot.version} with {len(snapshot)} products")
+    refresher.request_refresh()
+    return True
+
+def sort_by_price(positions, price_column, descending=False):
+    """Order positions by price, keeping unpriced products last"""
+    sign = -1 if descending else 1
+    return sorted(positions, key=lambda pos: (price_column[pos] is None, sign * (price_column[pos] or 0)))
 
-def filter_products(products, search=None, category=None, min_price=None, max_price=None):
-    """Filter products based on search criteria"""
-    filtered = products.copy()
+def filter_products(snapshot, search=None, category=None, min_price=None, max_price=None, sort=None, fuzzy=False):
+    """Filter products based on search criteria, ranking search hits by relevance"""
+    price_index = snapshot.price_index
+    has_range = min_price is not None or max_price is not None
     
+    if search or (category and category != 'all'):
+        if search and fuzzy:
+            positions = snapshot.search_index.fuzzy_search(search, category)
+        else:
+            positions = snapshot.search_index.search(search, category)
+        if has_range:
+            positions = [pos for pos in positions if price_index.in_range(pos, min_price, max_price)]
+        if sort in ('price', '-price'):
+            positions = sort_by_price(positions, price_index.column, descending=sort == '-price')
+    elif has_range:
+        positions = price_index.range(min_price, max_price)
+        if sort == '-price':
+            positions = positions[::-1]
+        elif sort != 'price':
+            positions = sorted(positions)
+    elif sort == 'price':
+        positions = list(price_index.positions) + price_index.unpriced
+    elif sort == '-price':
+        positions = list(reversed(price_index.positions)) + price_index.unpriced
+    else:
+        positions = range(len(snapshot.products))
+    
+    products = snapshot.products
+    return [products[pos] for pos in positions]
+
+def cached_filter_products(snapshot, search=None, category=None, min_price=None, max_price=None, sort=None,
+                           fuzzy=False):
+    """filter_products memoized per snapshot version; the result is a shared tuple"""
+    search = search.lower() if search else None
+    category = category if category and category != 'all' else None
+    sort = sort if sort in ('price', '-price') else None
+    fuzzy = bool(fuzzy and search)
+    key = (snapshot.version, search, category, min_price, max_price, sort, fuzzy)
+    products = query_cache.get(key)
+    if products is None:
+        started = time.perf_counter()
+        products = tuple(filter_products(snapshot, search, category, min_price, max_price, sort, fuzzy))
+        filter_seconds.observe(time.perf_counter() - started)
+        query_cache.put(key, products)
+    return products
+
+def facet_products(snapshot, search=None, categories=(), sources=(), price_buckets=(), min_price=None,
+                   max_price=None, sort=None, fuzzy=False):
+    """Filter by ANDing facet bitmaps and count every facet value; memoized like cached_filter_products"""
+    search = search.lower() if search else None
+    sort = sort if sort in ('price', '-price') else None
+    fuzzy = bool(fuzzy and search)
+    key = (snapshot.version, 'facets', search, categories, sources, price_buckets, min_price, max_price, sort, fuzzy)
+    result = query_cache.get(key)
+    if result is not None:
+        return result
+    
+    started = time.perf_counter()
+    facet_index = snapshot.facet_index
+    filters = {}
+    ranked = None
     if search:
-        search_lower = search.lower()
-        filtered = [p for p in filtered if (
-            search_lower in p['title'].lower() or
-            search_lower in p['description'].lower() or
-            search_lower in p['category'].lower()
-        )]
+        search_index = snapshot.search_index
+        ranked = search_index.fuzzy_search(search) if fuzzy else search_index.search(search)
+        filters['search'] = to_bitmap(ranked)
+    if categories:
+        filters['category'] = facet_index.select('category', categories)
+    if sources:
+        filters['source'] = facet_index.select('source', sources)
+    if price_buckets:
+        filters['price_range'] = facet_index.select('price_range', price_buckets)
+    if min_price is not None or max_price is not None:
+        filters['price'] = to_bitmap(snapshot.price_index.range(min_price, max_price))
+    matches, counts = facet_index.query(filters)
+    
+    if not filters:
+        positions = range(len(snapshot.products))
+    elif ranked is None:
+        positions = bitmap_positions(matches)
+    elif len(filters) > 1:
+        selected = set(bitmap_positions(matches))
+        positions = [pos for pos in ranked if pos in selected]
+    else:
+        positions = ranked
+    if sort:
+        positions = sort_by_price(positions, snapshot.price_index.column, descending=sort == '-price')
+    
+    products = snapshot.products
+    result = (products if isinstance(positions, range) else tuple(products[pos] for pos in positions), counts)
+    filter_seconds.observe(time.perf_counter() - started)
+    query_cache.put(key, result)
+    return result
+
+def lookup_products(snapshot, ids):
+    """Resolve many product ids against the snapshot id index"""
+    by_id = snapshot.by_id
+    found = []
+    missing = []
+    for product_id in ids:
+        product = by_id.get(product_id)
+        if product is None:
+            missing.append(product_id)
+        else:
+            found.append(product)
+    return found, missing
+
+def snapshot_timestamp(snapshot):
+    """Publish time of a snapshot, which stamps every response built from it"""
+    return snapshot.last_updated.isoformat() if snapshot.last_updated else None
+
+def query_products(snapshot, search='', category='', min_price=None, max_price=None, sort='', limit=None,
+                   fuzzy=False):
+    """Run a /api/products query and apply its overall limit"""
+    filtered_products = cached_filter_products(
+        snapshot,
+        search=search if search else None,
+        category=category if category else None,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort if sort else None,
+        fuzzy=fuzzy
+    )
+    
+    if limit:
+        filtered_products = filtered_products[:limit]
+    
+    return filtered_products
+
+def products_envelope(snapshot, search, category, min_price, max_price, sort, fuzzy=False):
+    """Fields every /api/products listing carries next to its data"""
+    return {
+        'success': True,
+        'filters': {
+            'search': search,
+            'category': category,
+            'min_price': min_price,
+            'max_price': max_price,
+            'sort': sort,
+            'fuzzy': fuzzy
+        },
+        'last_updated': snapshot_timestamp(snapshot),
+        'timestamp': snapshot_timestamp(snapshot)
+    }
+
+def products_payload(snapshot, search='', category='', min_price=None, max_price=None, sort='', limit=None,
+                     offset=None, page_size=None, paginated=False, fuzzy=False):
+    """Build the /api/products listing for a snapshot, one page at a time when paginated"""
+    filtered_products = query_products(snapshot, search, category, min_price, max_price, sort, limit, fuzzy)
+    payload = products_envelope(snapshot, search, category, min_price, max_price, sort, fuzzy)
+    
+    if paginated:
+        filtered_products, payload['pagination'] = paginate(filtered_products, snapshot.version, offset, page_size)
+    
+    payload['data'] = filtered_products
+    payload['total'] = len(filtered_products)
+    return payload
+
+def facets_payload(snapshot, search='', categories=(), sources=(), price_buckets=(), min_price=None, max_price=None,
+                   sort='', limit=None, offset=None, page_size=None, paginated=False, fuzzy=False):
+    """Build a faceted /api/products listing: the matching products plus per-facet counts"""
+    filtered_products, counts = facet_products(snapshot, search, categories, sources, price_buckets, min_price,
+                                               max_price, sort, fuzzy)
+    if limit:
+        filtered_products = filtered_products[:limit]
+    payload = products_envelope(snapshot, search, ','.join(categories), min_price, max_price, sort, fuzzy)
+    payload['filters']['source'] = ','.join(sources)
+    payload['filters']['price_bucket'] = ','.join(price_buckets)
+    
+    if paginated:
+        filtered_products, payload['pagination'] = paginate(filtered_products, snapshot.version, offset, page_size)
+    
+    payload['data'] = filtered_products
+    payload['total'] = len(filtered_products)
+    payload['facets'] = counts
+    return payload
+
+def batch_payload(snapshot, ids):
+    """Build the response for a batch id lookup"""
+    found, missing = lookup_products(snapshot, ids)
+    return {
+        'success': True,
+        'data': found,
+        'total': len(found),
+        'missing': missing,
+        'last_updated': snapshot_timestamp(snapshot),
+        'timestamp': snapshot_timestamp(snapshot)
+    }
+
+def refresh_payload(job):
+    return {
+        'success': True,
+        'message': 'Product refresh enqueued',
+        'job': job,
+        'version': snapshot_store.current.version,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def health_payload():
+    snapshot = snapshot_store.current
+    return {
+        'success': True,
+        'status': 'healthy',
+        'products_loaded': len(snapshot.products),
+        'snapshot_version': snapshot.version,
+        'last_updated': snapshot.last_updated.isoformat() if snapshot.last_updated else None,
+        'sources': source_registry.stats(),
+        'imports': imported_catalogue.stats(),
+        'caches': {
+            'responses': response_cache.stats(),
+            'queries': query_cache.stats()
+        },
+        'timestamp': datetime.now().isoformat()
+    }
+
+def product_payload(snapshot, product_id):
+    return {
+        'success': True,
+        'data': snapshot.by_id[product_id],
+        'timestamp': snapshot_timestamp(snapshot)
+    }
+
+def categories_payload(snapshot):
+    categories = snapshot.aggregates.categories
+    return {
+        'success': True,
+        'data': categories,
+        'total': len(categories),
+        'timestamp': snapshot_timestamp(snapshot)
+    }
+
+def stats_payload(snapshot):
+    aggregates = snapshot.aggregates
+    return {
+        'success': True,
+        'data': {
+            'total_products': aggregates.total,
+            'categories': aggregates.category_counts,
+            'sources': aggregates.source_counts,
+            'price_ranges': aggregates.price_ranges,
+            'last_updated': snapshot_timestamp(snapshot)
+        },
+        'timestamp': snapshot_timestamp(snapshot)
+    }
+
+class QueryError(Exception):
+    """A request the API answers with {'success': False, 'error': ...} and the given status"""
     
-    if category and category != 'all':
-        filtered = [p for p in filtered if p['category'] == category]
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def error_payload(message):
+    return {
+        'success': False,
+        'error': message
+    }
+
+def query_flag(args, name):
+    return args.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def query_price(args, name):
+    """A price bound; NaN and infinities parse as floats but cannot be compared or sent back as JSON"""
+    value = args.get(name, type=float)
+    if value is not None and not math.isfinite(value):
+        raise QueryError(f'{name} must be a finite number')
+    return value
+
+def query_list(args, name):
+    """A comma-separated argument as a sorted tuple, so equal selections share cache entries"""
+    return tuple(sorted({part.strip() for part in args.get(name, '').split(',') if part.strip()}))
+
+def parse_products_query(args):
+    """Read and validate /api/products arguments; shared by the Flask and ASGI front ends"""
+    query = {'ids': None}
+    if 'ids' in args:
+        try:
+            query['ids'] = [int(part) for part in args['ids'].split(',') if part.strip()]
+        except ValueError:
+            raise QueryError('ids must be a comma-separated list of integers')
+        return query
+    
+    query['search'] = args.get('search', '').strip()
+    query['category'] = args.get('category', '').strip()
+    query['min_price'] = query_price(args, 'min_price')
+    query['max_price'] = query_price(args, 'max_price')
+    query['sort'] = args.get('sort', '').strip()
+    query['limit'] = args.get('limit', type=int)
+    query['offset'] = args.get('offset', type=int)
+    query['page_size'] = args.get('page_size', type=int)
+    query['stream'] = args.get('stream', '').strip()
+    query['fuzzy'] = query_flag(args, 'fuzzy')
+    query['facets'] = query_flag(args, 'facets')
+    query['sources'] = query_list(args, 'source')
+    query['price_buckets'] = query_list(args, 'price_bucket')
+    if query['facets']:
+        if query['stream']:
+            raise QueryError('facets cannot be combined with stream')
+        # "all" means no category filter, as in filter_products
+        query['categories'] = tuple(category for category in query_list(args, 'category') if category != 'all')
+        unknown = [bucket for bucket in query['price_buckets'] if bucket not in PRICE_BUCKET_NAMES]
+        if unknown:
+            raise QueryError(f"Unknown price_bucket {unknown[0]!r}, expected one of {', '.join(PRICE_BUCKET_NAMES)}")
+    elif query['sources'] or query['price_buckets']:
+        raise QueryError('source and price_bucket filters need facets=1')
+    cursor = args.get('cursor', '').strip()
+    snapshot = snapshot_store.current
     
-    # if min_price or max_price:
-    #     pass
+    if cursor:
+        try:
+            version, query['offset'] = decode_cursor(cursor)
+        except ValueError as e:
+            raise QueryError(str(e))
+        snapshot = snapshot_store.get(version)
+        if snapshot is None:
+            raise QueryError('Cursor has expired, restart pagination from the first page', 410)
     
-    return filtered
+    query['snapshot'] = snapshot
+    query['paginated'] = bool(cursor) or query['offset'] is not None or query['page_size'] is not None
+    return query
+
+def parse_import_options(args, mimetype):
+    """Read and validate /api/import arguments into (format, mode, defaults for missing fields)"""
+    fmt = args.get('format', '').strip().lower() or ('csv' if mimetype == 'text/csv' else 'ndjson')
+    if fmt not in IMPORT_FORMATS:
+        raise QueryError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    mode = args.get('mode', '').strip().lower() or 'merge'
+    if mode not in IMPORT_MODES:
+        raise QueryError(f"mode must be one of {', '.join(IMPORT_MODES)}")
+    defaults = {name: args[name].strip() for name in ('source', 'category', 'currency') if args.get(name, '').strip()}
+    return fmt, mode, defaults
+
+def export_request(args):
+    """(snapshot, content type, chunks, headers) streaming the current snapshot in the requested format"""
+    snapshot = snapshot_store.current
+    fmt = args.get('format', '').strip().lower() or 'ndjson'
+    try:
+        content_type, chunks = export_feed(snapshot.products, fmt)
+    except ValueError as e:
+        raise QueryError(str(e))
+    headers = {
+        'X-Snapshot-Version': str(snapshot.version),
+        'X-Total-Count': str(len(snapshot.products)),
+        'Content-Disposition': f'attachment; filename="products-v{snapshot.version}.{fmt}"'
+    }
+    return snapshot, content_type, chunks, headers
+
+def products_request(query):
+    """(snapshot, cache key, payload builder) for a parsed, non-streamed /api/products query"""
+    snapshot = query['snapshot']
+    paging = (query['paginated'], query['offset'], query['page_size'])
+    if query['facets']:
+        args = (query['search'], query['categories'], query['sources'], query['price_buckets'], query['min_price'],
+                query['max_price'], query['sort'], query['limit'])
+        return snapshot, ('facets',) + args + paging + (query['fuzzy'],), lambda: facets_payload(
+            snapshot, *args, query['offset'], query['page_size'], query['paginated'], query['fuzzy'])
+    args = (query['search'], query['category'], query['min_price'], query['max_price'], query['sort'],
+            query['limit'])
+    return snapshot, ('products',) + args + paging + (query['fuzzy'],), lambda: products_payload(
+        snapshot, *args, query['offset'], query['page_size'], query['paginated'], query['fuzzy'])
+
+def batch_request(ids):
+    """(snapshot, cache key, payload builder) for a batch id lookup"""
+    if len(ids) > MAX_BATCH_IDS:
+        raise QueryError(f'At most {MAX_BATCH_IDS} ids can be requested at once')
+    snapshot = snapshot_store.current
+    return snapshot, ('batch', tuple(ids)), lambda: batch_payload(snapshot, ids)
+
+def product_request(product_id):
+    """(snapshot, cache key, payload builder) for a single product"""
+    snapshot = snapshot_store.current
+    if product_id not in snapshot.by_id:
+        raise QueryError('Product not found', 404)
+    return snapshot, ('product', product_id), lambda: product_payload(snapshot, product_id)
+
+def cache_headers(etag):
+    return {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'public, max-age={CACHE_MAX_AGE}',
+        'Vary': 'Accept-Encoding'
+    }
+
+def cached_entry(key, build):
+    """The serialized response for a versioned key, building and storing it on a cache miss"""
+    entry = response_cache.get(key)
+    if entry is None:
+        payload = build()
+        started = time.perf_counter()
+        entry = response_cache.put(key, payload)
+        serialize_seconds.observe(time.perf_counter() - started)
+    return entry
+
+def cached_json(snapshot, key, build):
+    """Serve a snapshot-derived payload from the response cache, answering revalidations with 304"""
+    key = (snapshot.version,) + key
+    etag = make_etag(key, snapshot.last_updated)
+    
+    for tag in (etag, gzip_etag(etag)):
+        if request.if_none_match.contains_weak(tag):
+            return Response(status=304, headers=cache_headers(tag))
+    
+    entry = cached_entry(key, build)
+    
+    if entry.gzipped is not None and request.accept_encodings['gzip']:
+        headers = cache_headers(gzip_etag(etag))
+        headers['Content-Encoding'] = 'gzip'
+        return Response(entry.gzipped, mimetype='application/json', headers=headers)
+    return Response(entry.body, mimetype='application/json', headers=cache_headers(etag))
+
+def batch_response(ids):
+    """Serve a batch id lookup through the response cache"""
+    try:
+        return cached_json(*batch_request(ids))
+    except QueryError as e:
+        return jsonify(error_payload(str(e))), e.status
+
+def stream_products(snapshot, stream, search, category, min_price, max_price, sort, limit, fuzzy=False):
+    """Stream a /api/products result as NDJSON or as a chunked JSON document"""
+    filtered_products = query_products(snapshot, search, category, min_price, max_price, sort, limit, fuzzy)
+    headers = {'X-Snapshot-Version': str(snapshot.version), 'X-Total-Count': str(len(filtered_products))}
+    
+    if stream == 'ndjson':
+        return Response(iter_ndjson(filtered_products), mimetype='application/x-ndjson', headers=headers)
+    if stream == 'json':
+        envelope = products_envelope(snapshot, search, category, min_price, max_price, sort, fuzzy)
+        envelope['total'] = len(filtered_products)
+        return Response(iter_json_array(envelope, filtered_products), mimetype='application/json', headers=headers)
+    
+    return jsonify({
+        'success': False,
+        'error': 'stream must be "ndjson" or "json"'
+    }), 400
 
 @app.route('/')
 def index():
@@ -382,37 +829,20 @@ def index():
 def get_products():
     """Get all products with optional filtering"""
     try:
+        try:
+            query = parse_products_query(request.args)
+        except QueryError as e:
+            return jsonify(error_payload(str(e))), e.status
         
-        search = request.args.get('search', '').strip()
-        category = request.args.get('category', '').strip()
-        min_price = request.args.get('min_price')
-        max_price = request.args.get('max_price')
-        limit = request.args.get('limit', type=int)
-        
-        filtered_products = filter_products(
-            products_cache, 
-            search=search if search else None,
-            category=category if category else None,
-            min_price=min_price,
-            max_price=max_price
-        )
+        if query['ids'] is not None:
+            return batch_response(query['ids'])
         
-        if limit:
-            filtered_products = filtered_products[:limit]
+        if query['stream']:
+            return stream_products(query['snapshot'], query['stream'], query['search'], query['category'],
+                                   query['min_price'], query['max_price'], query['sort'], query['limit'],
+                                   query['fuzzy'])
         
-        return jsonify({
-            'success': True,
-            'data': filtered_products,
-            'total': len(filtered_products),
-            'filters': {
-                'search': search,
-                'category': category,
-                'min_price': min_price,
-                'max_price': max_price
-            },
-            'last_updated': last_updated.isoformat() if last_updated else None,
-            'timestamp': datetime.now().isoformat()
-        })
+        return cached_json(*products_request(query))
     
     except Exception as e:
         logger.error(f"Error in get_products: {e}")
@@ -425,22 +855,33 @@ def get_products():
 def get_product(product_id):
     """Get a specific product by ID"""
     try:
-        product = next((p for p in products_cache if p['id'] == product_id), None)
-        
-        if product:
-            return jsonify({
-                'success': True,
-                'data': product,
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
+        try:
+            return cached_json(*product_request(product_id))
+        except QueryError as e:
+            return jsonify(error_payload(str(e))), e.status
+    
+    except Exception as e:
+        logger.error(f"Error in get_product: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/products/batch', methods=['POST'])
+def get_products_batch():
+    """Get many products by ID in one request"""
+    try:
+        body = request.get_json(silent=True) or {}
+        ids = body.get('ids')
+        if not isinstance(ids, list) or not all(type(product_id) is int for product_id in ids):
             return jsonify({
                 'success': False,
-                'error': 'Product not found'
-            }), 404
+                'error': 'Request body must be {"ids": [<int>, ...]}'
+            }), 400
+        return batch_response(ids)
     
     except Exception as e:
-        logger.error(f"Error in get_product: {e}")
+        logger.error(f"Error in get_products_batch: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -448,39 +889,101 @@ def get_product(product_id):
 
 @app.route('/api/refresh', methods=['POST'])
 def refresh_products():
-    """Refresh product data from sources"""
+    """Enqueue a background refresh of product data"""
     try:
-        logger.info("Refreshing product data...")
-        initialize_products()
+        job = refresher.request_refresh()
+        logger.info(f"Refresh requested, job {job['job_id']} is {job['status']}")
         
+        return jsonify(refresh_payload(job)), 202
+    
+    except Exception as e:
+        logger.error(f"Error in refresh_products: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/refresh/<job_id>', methods=['GET'])
+def get_refresh_job(job_id):
+    """Get the status of a refresh job"""
+    job = refresher.get_job(job_id)
+    
+    if job:
         return jsonify({
             'success': True,
-            'message': 'Product data refreshed successfully',
-            'total_products': len(products_cache),
-            'last_updated': last_updated.isoformat(),
+            'job': job,
             'timestamp': datetime.now().isoformat()
         })
+    else:
+        return jsonify({
+            'success': False,
+            'error': 'Refresh job not found'
+        }), 404
+
+@app.route('/api/import', methods=['POST'])
+def import_catalogue():
+    """Stream a CSV or NDJSON feed into the imported products and publish them in a refresh job"""
+    if not IMPORT_TOKEN:
+        return jsonify(error_payload('Imports are disabled; set IMPORT_TOKEN to enable them')), 403
+    if request.headers.get('Authorization') != f'Bearer {IMPORT_TOKEN}':
+        return jsonify(error_payload('A valid bearer token is required to import')), 401
+    try:
+        try:
+            fmt, mode, defaults = parse_import_options(request.args, request.mimetype)
+            stream = io.BufferedReader(request.stream, IMPORT_BUFFER_BYTES)
+            if request.content_encoding == 'gzip':
+                stream = gzip.GzipFile(fileobj=stream)
+            products, report = import_feed(stream, fmt, defaults,
+                                           max_bytes=IMPORT_MAX_BYTES, max_rows=IMPORT_MAX_ROWS)
+        except QueryError as e:
+            return jsonify(error_payload(str(e))), e.status
+        except ImportTooLarge as e:
+            return jsonify(error_payload(str(e))), 413
+        except ValueError as e:
+            return jsonify(error_payload(str(e))), 400
+        
+        if not products:
+            payload = error_payload('The feed has no valid rows, nothing was imported')
+            payload['report'] = report.to_dict()
+            return jsonify(payload), 400
+        
+        total = imported_catalogue.apply(products, mode)
+        job = refresher.request_refresh(trigger='import')
+        logger.info(f"Imported {len(products)} products ({mode}), {total} held, refresh job {job['job_id']}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Import stored, publishing it in a refresh job',
+            'mode': mode,
+            'report': report.to_dict(),
+            'imported_total': total,
+            'job': job,
+            'version': snapshot_store.current.version,
+            'timestamp': datetime.now().isoformat()
+        }), 202
     
     except Exception as e:
-        logger.error(f"Error in refresh_products: {e}")
+        logger.error(f"Error in import_catalogue: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/export', methods=['GET'])
+def export_catalogue():
+    """Stream the whole current snapshot as NDJSON or CSV"""
+    try:
+        _, content_type, chunks, headers = export_request(request.args)
+    except QueryError as e:
+        return jsonify(error_payload(str(e))), e.status
+    return Response(chunks, mimetype=content_type, headers=headers)
+
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get all available categories"""
     try:
-        categories = list(set(product['category'] for product in products_cache))
-        categories.sort()
-        
-        return jsonify({
-            'success': True,
-            'data': categories,
-            'total': len(categories),
-            'timestamp': datetime.now().isoformat()
-        })
+        snapshot = snapshot_store.current
+        return cached_json(snapshot, ('categories',), lambda: categories_payload(snapshot))
     
     except Exception as e:
         logger.error(f"Error in get_categories: {e}")
@@ -493,43 +996,8 @@ def get_categories():
 def get_stats():
     """Get statistics about the product database"""
     try:
-        categories = {}
-        price_ranges = {
-            'under_10k': 0,
-            '10k_50k': 0,
-            '50k_100k': 0,
-            'above_100k': 0
-        }
-        
-        for product in products_cache:
-           
-            category = product['category']
-            categories[category] = categories.get(category, 0) + 1
-
-            price_text = product['price']
-            if '₹' in price_text:
-                price_match = re.search(r'₹([\d,]+)', price_text)
-                if price_match:
-                    price_num = int(price_match.group(1).replace(',', ''))
-                    if price_num < 10000:
-                        price_ranges['under_10k'] += 1
-                    elif price_num < 50000:
-                        price_ranges['10k_50k'] += 1
-                    elif price_num < 100000:
-                        price_ranges['50k_100k'] += 1
-                    else:
-                        price_ranges['above_100k'] += 1
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'total_products': len(products_cache),
-                'categories': categories,
-                'price_ranges': price_ranges,
-                'last_updated': last_updated.isoformat() if last_updated else None
-            },
-            'timestamp': datetime.now().isoformat()
-        })
+        snapshot = snapshot_store.current
+        return cached_json(snapshot, ('stats',), lambda: stats_payload(snapshot))
     
     except Exception as e:
         logger.error(f"Error in get_stats: {e}")
@@ -541,13 +1009,12 @@ def get_stats():
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'success': True,
-        'status': 'healthy',
-        'products_loaded': len(products_cache),
-        'last_updated': last_updated.isoformat() if last_updated else None,
-        'timestamp': datetime.now().isoformat()
-    })
+    return jsonify(health_payload())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this process"""
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.errorhandler(404)
 def not_found(error):
@@ -563,9 +1030,76 @@ def internal_error(error):
         'error': 'Internal server error'
     }), 500
 
+def cache_ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else None
+
+def snapshot_age():
+    snapshot = snapshot_store.current
+    return (datetime.now() - snapshot.last_updated).total_seconds() if snapshot.last_updated else None
+
+def source_stat(field):
+    return lambda: {name: stats[field] for name, stats in source_registry.stats().items()}
+
+# Every route gets its histogram now so recording a request never allocates one
+ROUTE_NAMES = sorted({rule.endpoint for rule in app.url_map.iter_rules()}) + ['other']
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+request_seconds = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Time to handle a request, by Flask endpoint', label='route', values=ROUTE_NAMES)
+responses_total = metrics_registry.counter(
+    'http_responses_total', 'Responses sent, by status class', label='status', values=STATUS_CLASSES)
+status_counters = [responses_total[name] for name in STATUS_CLASSES]
+
+metrics_registry.collect('snapshot_products', 'gauge', 'Products in the current snapshot',
+                         lambda: len(snapshot_store.current))
+metrics_registry.collect('snapshot_version', 'gauge', 'Version of the current snapshot',
+                         lambda: snapshot_store.current.version)
+metrics_registry.collect('snapshot_age_seconds', 'gauge', 'Seconds since the current snapshot was published',
+                         snapshot_age)
+metrics_registry.collect('cache_hits_total', 'counter', 'Cache lookups that found an entry',
+                         lambda: {'responses': response_cache.hits, 'queries': query_cache.hits}, label='cache')
+metrics_registry.collect('cache_misses_total', 'counter', 'Cache lookups that missed',
+                         lambda: {'responses': response_cache.misses, 'queries': query_cache.misses}, label='cache')
+metrics_registry.collect('cache_hit_ratio', 'gauge', 'Share of cache lookups that hit since startup',
+                         lambda: {'responses': cache_ratio(response_cache.hits, response_cache.misses),
+                                  'queries': cache_ratio(query_cache.hits, query_cache.misses)}, label='cache')
+metrics_registry.collect('cache_entries', 'gauge', 'Entries held by each cache',
+                         lambda: {'responses': len(response_cache.entries), 'queries': len(query_cache.entries)},
+                         label='cache')
+metrics_registry.collect('response_cache_bytes', 'gauge', 'Bytes held by the response cache',
+                         lambda: response_cache.current_bytes)
+metrics_registry.collect('scrape_duration_seconds', 'gauge', 'Duration of the last fetch of each source',
+                         source_stat('last_duration'), label='source')
+metrics_registry.collect('scrape_fetches_total', 'counter', 'Fetches attempted per source',
+                         source_stat('fetches'), label='source')
+metrics_registry.collect('scrape_failures_total', 'counter', 'Fetches per source that failed after retries',
+                         source_stat('failures_total'), label='source')
+metrics_registry.collect('source_products', 'gauge', 'Products currently held from each source',
+                         source_stat('products'), label='source')
+metrics_registry.collect('imported_products', 'gauge', 'Products held from bulk imports',
+                         lambda: len(imported_catalogue))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe the request in its route histogram and count its status class"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        histogram = request_seconds.get(request.endpoint) or request_seconds['other']
+        histogram.observe(time.perf_counter() - started)
+    status_counters[min(max(response.status_code // 100, 1), 5) - 1].inc()
+    return response
+
 if __name__ == '__main__':
     
-    initialize_products()
+    # debug=True runs this module twice under the Werkzeug reloader: in a monitor process and in the
+    # child that serves. Only the serving child loads a snapshot and runs the background refresher.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_start()
+        refresher.start()
     
     # for runnig  the app
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
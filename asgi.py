@@ -0,0 +1,417 @@
+"""ASGI entry point for the read API, serving the in-memory snapshot from an event loop
+
+    python asgi.py            # built-in asyncio server (asgi_server.py) on ASGI_HOST:ASGI_PORT
+    uvicorn asgi:app          # or any other ASGI server
+
+Responses match the Flask app byte for byte: both share the query parsing,
+payload builders and response cache in app.py. Cache hits are answered on
+the loop. Misses and streamed listings are built in the default executor so
+a slow query never stalls other connections. Refreshes run as an asyncio task
+that scrapes and publishes in the executor instead of on a dedicated thread.
+
+/api/stream exists only here: it pushes every publish to Server-Sent Events
+clients, and an idle client costs a coroutine and a small queue, not a thread.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+import app as backend
+from asgi_server import Server
+from events import KEEPALIVE_FRAME, STREAM_KEEPALIVE, STREAM_RETRY_MS, EventBroadcaster
+from pagination import iter_json_array, iter_ndjson
+from response_cache import gzip_etag, make_etag, serialize_json
+from snapshot import RefreshScheduler
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_PATH = re.compile(r'/api/products/(\d+)$')
+REFRESH_JOB_PATH = re.compile(r'/api/refresh/([^/]+)$')
+
+
+class AsyncRefreshScheduler(RefreshScheduler):
+    """RefreshScheduler driven by an asyncio task; scraping and publishing run in the default executor"""
+
+    def __init__(self, store, loader, interval=None):
+        super().__init__(store, loader, interval)
+        self.loop = None
+        self.task = None
+        self.async_wakeup = None
+
+    def start(self):
+        """Start the refresh task on the running event loop"""
+        if self.task is None or self.task.done():
+            self.loop = asyncio.get_running_loop()
+            self.async_wakeup = asyncio.Event()
+            self.task = self.loop.create_task(self._run_async())
+
+    def stop(self, timeout=None):
+        if self.task is not None:
+            self.task.cancel()
+
+    def request_refresh(self, trigger='manual'):
+        """Enqueue a refresh and return its job; callable from the loop or any thread"""
+        with self.lock:
+            job = self._reusable_job(trigger)
+            if job is None:
+                job = self._new_job(trigger)
+                self.pending = job
+        self.loop.call_soon_threadsafe(self.async_wakeup.set)
+        return dict(job)
+
+    async def _run_async(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.async_wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.async_wakeup.clear()
+            await self.loop.run_in_executor(None, self._refresh, self._next_job())
+
+
+refresher = AsyncRefreshScheduler(backend.snapshot_store, backend.scrape_tech_products,
+                                  interval=backend.REFRESH_INTERVAL)
+broadcaster = EventBroadcaster(backend.snapshot_store)
+
+backend.metrics_registry.collect('stream_clients', 'gauge', 'Connected /api/stream clients',
+                                 lambda: len(broadcaster.clients))
+backend.metrics_registry.collect('stream_events_total', 'counter', 'Snapshot changes pushed to /api/stream',
+                                 lambda: broadcaster.events)
+backend.metrics_registry.collect('stream_overflows_total', 'counter',
+                                 'Stream clients that fell a whole queue behind and were told to reset',
+                                 lambda: broadcaster.overflows)
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def _etag_matches(if_none_match, etag):
+    """Weak If-None-Match comparison, as werkzeug's contains_weak"""
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+def _accepts_gzip(accept_encoding):
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            quality = params.strip()
+            if not quality.startswith('q='):
+                return True
+            try:
+                return float(quality[2:] or 0) != 0
+            except ValueError:
+                # A malformed q-value is treated as not acceptable rather than failing the request
+                return False
+    return False
+
+
+def _headers(content_type=None, extra=None):
+    headers = [(b'access-control-allow-origin', b'*')]
+    if content_type:
+        headers.append((b'content-type', content_type.encode('latin-1')))
+    for name, value in (extra or {}).items():
+        headers.append((name.lower().encode('latin-1'), str(value).encode('latin-1')))
+    return headers
+
+
+async def send_response(send, status, body=b'', headers=None):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers or _headers()})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, payload, status=200):
+    await send_response(send, status, serialize_json(payload), _headers('application/json'))
+
+
+async def send_cached(scope, send, snapshot, key, build):
+    """The ASGI twin of app.cached_json"""
+    key = (snapshot.version,) + key
+    etag = make_etag(key, snapshot.last_updated)
+    if_none_match = _header(scope, b'if-none-match')
+    for tag in (etag, gzip_etag(etag)):
+        if _etag_matches(if_none_match, tag):
+            await send_response(send, 304, headers=_headers(extra=backend.cache_headers(tag)))
+            return
+
+    if key in backend.response_cache.entries:
+        entry = backend.cached_entry(key, build)
+    else:
+        entry = await asyncio.get_running_loop().run_in_executor(None, backend.cached_entry, key, build)
+
+    body = entry.body
+    headers = backend.cache_headers(etag)
+    if entry.gzipped is not None and _accepts_gzip(_header(scope, b'accept-encoding')):
+        headers = backend.cache_headers(gzip_etag(etag))
+        headers['Content-Encoding'] = 'gzip'
+        body = entry.gzipped
+    await send_response(send, 200, body, _headers('application/json', headers))
+
+
+async def send_stream(send, chunks, content_type, headers):
+    """Stream chunks produced by a blocking generator, pulling each one in the executor"""
+    loop = asyncio.get_running_loop()
+    await send({'type': 'http.response.start', 'status': 200, 'headers': _headers(content_type, headers)})
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            break
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def get_products(scope, receive, send):
+    args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+    try:
+        query = backend.parse_products_query(args)
+        if query['ids'] is not None:
+            await send_cached(scope, send, *backend.batch_request(query['ids']))
+            return
+    except backend.QueryError as e:
+        await send_json(send, backend.error_payload(str(e)), e.status)
+        return
+
+    if not query['stream']:
+        await send_cached(scope, send, *backend.products_request(query))
+        return
+
+    snapshot = query['snapshot']
+    filtered_products = await asyncio.get_running_loop().run_in_executor(
+        None, backend.query_products, snapshot, query['search'], query['category'], query['min_price'],
+        query['max_price'], query['sort'], query['limit'], query['fuzzy'])
+    headers = {'X-Snapshot-Version': snapshot.version, 'X-Total-Count': len(filtered_products)}
+    if query['stream'] == 'ndjson':
+        await send_stream(send, iter_ndjson(filtered_products), 'application/x-ndjson', headers)
+    elif query['stream'] == 'json':
+        envelope = backend.products_envelope(snapshot, query['search'], query['category'], query['min_price'],
+                                             query['max_price'], query['sort'], query['fuzzy'])
+        envelope['total'] = len(filtered_products)
+        await send_stream(send, iter_json_array(envelope, filtered_products), 'application/json', headers)
+    else:
+        await send_json(send, backend.error_payload('stream must be "ndjson" or "json"'), 400)
+
+
+async def get_product(scope, receive, send, product_id):
+    try:
+        await send_cached(scope, send, *backend.product_request(int(product_id)))
+    except backend.QueryError as e:
+        await send_json(send, backend.error_payload(str(e)), e.status)
+
+
+async def get_products_batch(scope, receive, send):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        ids = json.loads(body).get('ids') if body else None
+    except (ValueError, AttributeError):
+        ids = None
+    if not isinstance(ids, list) or not all(type(product_id) is int for product_id in ids):
+        await send_json(send, backend.error_payload('Request body must be {"ids": [<int>, ...]}'), 400)
+        return
+    try:
+        await send_cached(scope, send, *backend.batch_request(ids))
+    except backend.QueryError as e:
+        await send_json(send, backend.error_payload(str(e)), e.status)
+
+
+async def get_categories(scope, receive, send):
+    snapshot = backend.snapshot_store.current
+    await send_cached(scope, send, snapshot, ('categories',), lambda: backend.categories_payload(snapshot))
+
+
+async def get_stats(scope, receive, send):
+    snapshot = backend.snapshot_store.current
+    await send_cached(scope, send, snapshot, ('stats',), lambda: backend.stats_payload(snapshot))
+
+
+async def health_check(scope, receive, send):
+    # Collecting source and cache stats takes their locks, so it stays off the loop
+    payload = await asyncio.get_running_loop().run_in_executor(None, backend.health_payload)
+    await send_json(send, payload)
+
+
+async def refresh_products(scope, receive, send):
+    job = backend.refresher.request_refresh()
+    logger.info(f"Refresh requested, job {job['job_id']} is {job['status']}")
+    await send_json(send, backend.refresh_payload(job), 202)
+
+
+async def get_refresh_job(scope, receive, send, job_id):
+    job = backend.refresher.get_job(job_id)
+    if job:
+        await send_json(send, {'success': True, 'job': job, 'timestamp': datetime.now().isoformat()})
+    else:
+        await send_json(send, backend.error_payload('Refresh job not found'), 404)
+
+
+async def export_catalogue(scope, receive, send):
+    args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+    try:
+        _, content_type, chunks, headers = backend.export_request(args)
+    except backend.QueryError as e:
+        await send_json(send, backend.error_payload(str(e)), e.status)
+        return
+    await send_stream(send, chunks, content_type, headers)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(scope, receive, send):
+    """Server-Sent Events: a snapshot summary on connect, then a diff or reset frame per publish"""
+    queue = broadcaster.connect(_header(scope, b'last-event-id') or None)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': _headers('text/event-stream', {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})})
+        await send({'type': 'http.response.body', 'body': f"retry: {STREAM_RETRY_MS}\n\n".encode('latin-1'),
+                    'more_body': True})
+        while not disconnected.done():
+            next_frame = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({next_frame, disconnected}, timeout=STREAM_KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_frame in done:
+                frame = next_frame.result()
+            else:
+                next_frame.cancel()
+                if disconnected.done():
+                    break
+                frame = KEEPALIVE_FRAME
+            await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+    finally:
+        broadcaster.disconnect(queue)
+        disconnected.cancel()
+
+
+async def get_metrics(scope, receive, send):
+    body = await asyncio.get_running_loop().run_in_executor(None, backend.metrics_registry.render)
+    await send_response(send, 200, body.encode('utf-8'), _headers('text/plain; version=0.0.4; charset=utf-8'))
+
+
+async def index(scope, receive, send):
+    try:
+        with open('index.html', 'rb') as f:
+            body = f.read()
+    except FileNotFoundError:
+        await send_json(send, backend.error_payload('Endpoint not found'), 404)
+        return
+    await send_response(send, 200, body, _headers('text/html; charset=utf-8'))
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('GET', '/api/products'): get_products,
+    ('POST', '/api/products/batch'): get_products_batch,
+    ('GET', '/api/categories'): get_categories,
+    ('GET', '/api/stats'): get_stats,
+    ('GET', '/api/health'): health_check,
+    ('GET', '/api/stream'): stream_events,
+    ('GET', '/api/export'): export_catalogue,
+    ('POST', '/api/refresh'): refresh_products,
+    ('GET', '/metrics'): get_metrics
+}
+
+PATTERN_ROUTES = [
+    ('GET', PRODUCT_PATH, get_product),
+    ('GET', REFRESH_JOB_PATH, get_refresh_job)
+]
+
+
+def resolve(method, path):
+    """(handler, path arguments) for a request, or (None, ()) when nothing matches"""
+    if method == 'HEAD':
+        method = 'GET'
+    handler = ROUTES.get((method, path))
+    if handler is not None:
+        return handler, ()
+    for route_method, pattern, handler in PATTERN_ROUTES:
+        match = pattern.match(path)
+        if match and route_method == method:
+            return handler, match.groups()
+    return None, ()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                backend.refresher = refresher
+                refresher.start()
+                broadcaster.start()
+                # Embedders that published a snapshot before serving keep it
+                if backend.snapshot_store.current.version == 0:
+                    await asyncio.get_running_loop().run_in_executor(None, backend.warm_start)
+                await send({'type': 'lifespan.startup.complete'})
+            except Exception as e:
+                logger.error(f"ASGI startup failed: {e}")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+        elif message['type'] == 'lifespan.shutdown':
+            refresher.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    handler, path_args = resolve(scope['method'], scope['path'])
+    status = [200]
+
+    async def counting_send(message):
+        if message['type'] == 'http.response.start':
+            status[0] = message['status']
+        await send(message)
+
+    try:
+        if handler is None:
+            await send_json(counting_send, backend.error_payload('Endpoint not found'), 404)
+        else:
+            await handler(scope, receive, counting_send, *path_args)
+    except ConnectionError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in {handler.__name__}: {e}")
+        await send_json(counting_send, backend.error_payload(str(e)), 500)
+
+    # A stream lasts as long as the client stays, which says nothing about request latency
+    if handler is not stream_events:
+        name = handler.__name__ if handler is not None else 'other'
+        histogram = backend.request_seconds.get(name) or backend.request_seconds['other']
+        histogram.observe(time.perf_counter() - started)
+    backend.status_counters[min(max(status[0] // 100, 1), 5) - 1].inc()
+
+
+if __name__ == '__main__':
+    Server(app, host=os.environ.get('ASGI_HOST', '0.0.0.0'), port=int(os.environ.get('ASGI_PORT', 8000))).run()
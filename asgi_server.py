@@ -0,0 +1,275 @@
+"""Minimal asyncio HTTP/1.1 server for ASGI apps, so asgi:app runs without extra dependencies
+
+It speaks keep-alive, Content-Length request bodies, streamed (chunked)
+responses and the ASGI lifespan protocol, which is all the read API needs.
+Requests with Transfer-Encoding, a repeated Content-Length or a malformed
+header line get a 400, so no request body can be framed two ways.
+Any ASGI server (uvicorn, hypercorn) can serve asgi:app instead.
+"""
+import asyncio
+import logging
+import threading
+from http import HTTPStatus
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE = 16 * 1024
+MAX_HEADERS = 100
+MAX_BODY = 16 * 1024 * 1024
+
+
+def _status_line(status):
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    return f"HTTP/1.1 {status} {reason}\r\n".encode('latin-1')
+
+
+class Server:
+    """Serve one ASGI app on a host and port until shutdown() is called"""
+
+    def __init__(self, app, host='127.0.0.1', port=8000):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.started = threading.Event()
+        self.stopping = None
+        self.lifespan = None
+        self.connections = {}
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        await self._lifespan('startup')
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_LINE, backlog=2048)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Serving ASGI app on http://{self.host}:{self.port}")
+        self.started.set()
+        try:
+            await self.stopping.wait()
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+            # Closing the transports ends idle keep-alive reads with EOF, so handlers finish on their own
+            for writer in self.connections.values():
+                writer.close()
+            if self.connections:
+                await asyncio.wait(list(self.connections), timeout=5)
+            await self._lifespan('shutdown')
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    def shutdown(self):
+        """Stop serving; safe to call from another thread"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def _lifespan(self, event):
+        """Send a lifespan event to the app; apps that do not speak lifespan are served anyway"""
+        if event == 'startup':
+            queue = asyncio.Queue()
+            done = {'startup': asyncio.Event(), 'shutdown': asyncio.Event()}
+            failure = []
+
+            async def receive():
+                return await queue.get()
+
+            async def send(message):
+                phase, _, outcome = message['type'][len('lifespan.'):].partition('.')
+                if outcome == 'failed':
+                    failure.append(message.get('message', ''))
+                done[phase].set()
+
+            async def run():
+                try:
+                    await self.app({'type': 'lifespan', 'asgi': {'version': '3.0'}}, receive, send)
+                except Exception as e:
+                    logger.info(f"ASGI app does not support lifespan: {e}")
+                finally:
+                    for waiter in done.values():
+                        waiter.set()
+
+            self.lifespan = (queue, done, asyncio.ensure_future(run()))
+        queue, done, _ = self.lifespan
+        await queue.put({'type': f'lifespan.{event}'})
+        await done[event].wait()
+        if event == 'startup' and failure:
+            raise RuntimeError(f"ASGI startup failed: {failure[0]}")
+
+    async def _handle(self, reader, writer):
+        client = writer.get_extra_info('peername')
+        server = writer.get_extra_info('sockname')
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while not self.stopping.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                if line in (b'\r\n', b'\n'):
+                    continue
+                parts = line.decode('latin-1').rstrip('\r\n').split(' ')
+                if len(parts) != 3:
+                    await self._reject(writer, 400)
+                    break
+                method, target, version = parts
+
+                headers = []
+                malformed = False
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, colon, value = line.decode('latin-1').partition(':')
+                    # A name with whitespace around it may be read differently by a proxy in front
+                    malformed = malformed or not colon or not name or name != name.strip()
+                    headers.append((name.lower().encode('latin-1'), value.strip().encode('latin-1')))
+                    if len(headers) > MAX_HEADERS:
+                        break
+                if len(headers) > MAX_HEADERS:
+                    await self._reject(writer, 431)
+                    break
+                header_map = dict(headers)
+
+                # Bodies are framed by a single Content-Length only. Transfer-Encoding or a repeated
+                # Content-Length could frame the body differently than a proxy in front did.
+                lengths = [value for name, value in headers if name == b'content-length']
+                if (malformed or b'transfer-encoding' in header_map or len(lengths) > 1
+                        or not all(value.isdigit() for value in lengths)):
+                    await self._reject(writer, 400)
+                    break
+                length = int(lengths[0]) if lengths else 0
+                if length > MAX_BODY:
+                    await self._reject(writer, 413)
+                    break
+                body = await reader.readexactly(length) if length > 0 else b''
+
+                connection = header_map.get(b'connection', b'').lower()
+                keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+                path, _, query = target.partition('?')
+                scope = {
+                    'type': 'http',
+                    'asgi': {'version': '3.0', 'spec_version': '2.3'},
+                    'http_version': version[len('HTTP/'):],
+                    'method': method.upper(),
+                    'scheme': 'http',
+                    'path': unquote(path),
+                    'raw_path': path.encode('latin-1'),
+                    'query_string': query.encode('latin-1'),
+                    'root_path': '',
+                    'headers': headers,
+                    'client': client[:2] if client else None,
+                    'server': server[:2] if server else None
+                }
+                if not await self._respond(scope, body, reader, writer, keep_alive):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _reject(self, writer, status):
+        writer.write(_status_line(status) + b'content-length: 0\r\nconnection: close\r\n\r\n')
+        await writer.drain()
+
+    async def _respond(self, scope, body, reader, writer, keep_alive):
+        """Run the app for one request; returns whether the connection can serve another"""
+        state = {'status': None, 'headers': None, 'sent_headers': False, 'chunked': False, 'done': False,
+                 'body_delivered': False, 'reusable': keep_alive}
+        disconnected = asyncio.Event()
+        watcher = None
+        head = scope['method'] == 'HEAD'
+
+        def watch():
+            """Notice the client going away while a response is streaming"""
+            nonlocal watcher
+            if watcher is None:
+                watcher = asyncio.ensure_future(reader.read(1))
+                watcher.add_done_callback(on_readable)
+
+        def on_readable(task):
+            # Cancelled once the response is complete; bytes mid-stream are a pipelined request we
+            # will not serve, and EOF or an error is a disconnect
+            if task.cancelled():
+                return
+            state['reusable'] = False
+            if task.exception() is not None or not task.result():
+                disconnected.set()
+
+        async def receive():
+            if not state['body_delivered']:
+                state['body_delivered'] = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            watch()
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if disconnected.is_set():
+                raise ConnectionResetError('Client disconnected')
+            kind = message['type']
+            if kind == 'http.response.start':
+                state['status'] = message['status']
+                state['headers'] = [(bytes(name).lower(), bytes(value)) for name, value in message.get('headers', ())]
+                return
+            if kind != 'http.response.body' or state['done']:
+                return
+            chunk = message.get('body', b'')
+            more = message.get('more_body', False)
+            if not state['sent_headers']:
+                names = {name for name, _ in state['headers']}
+                if b'content-length' not in names:
+                    if more:
+                        state['chunked'] = True
+                        state['headers'].append((b'transfer-encoding', b'chunked'))
+                    else:
+                        state['headers'].append((b'content-length', str(len(chunk)).encode('latin-1')))
+                if not state['reusable']:
+                    state['headers'].append((b'connection', b'close'))
+                lines = [_status_line(state['status'])]
+                lines.extend(name + b': ' + value + b'\r\n' for name, value in state['headers'])
+                lines.append(b'\r\n')
+                writer.write(b''.join(lines))
+                state['sent_headers'] = True
+            if chunk and not head:
+                writer.write(b'%x\r\n%b\r\n' % (len(chunk), chunk) if state['chunked'] else chunk)
+            if not more:
+                if state['chunked'] and not head:
+                    writer.write(b'0\r\n\r\n')
+                state['done'] = True
+            else:
+                watch()
+            try:
+                await writer.drain()
+            except ConnectionError:
+                disconnected.set()
+                raise
+
+        try:
+            await self.app(scope, receive, send)
+        except ConnectionError:
+            return False
+        except Exception as e:
+            logger.error(f"Unhandled error in ASGI app for {scope['path']}: {e}")
+            if not state['sent_headers']:
+                writer.write(_status_line(500) + b'content-length: 0\r\nconnection: close\r\n\r\n')
+            return False
+        finally:
+            if watcher is not None and not watcher.done():
+                watcher.cancel()
+                await asyncio.wait([watcher])
+
+        if not state['sent_headers']:
+            writer.write(_status_line(500) + b'content-length: 0\r\nconnection: close\r\n\r\n')
+            return False
+        return state['done'] and state['reusable']
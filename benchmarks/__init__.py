@@ -0,0 +1 @@
+"""Offline benchmarks for the Tech Products Hub backend"""
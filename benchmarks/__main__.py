@@ -0,0 +1,65 @@
+"""Run the benchmark suite: micro-benchmarks and an in-process load test, with JSON output and regression checks
+
+Run from the repository root; everything is offline:
+
+    python -m benchmarks                                   # micro + load with the default sizes
+    python -m benchmarks micro --sizes 1000 10000 1000000
+    python -m benchmarks load --load-size 10000 --requests 2000 --concurrency 8
+    python -m benchmarks --json results.json               # machine-readable results
+    python -m benchmarks --json new.json --compare results.json --threshold 0.15
+    python -m benchmarks compare results.json new.json     # compare two saved runs
+"""
+import argparse
+import os
+import sys
+
+# Never touch the snapshot database or scrape anything while benchmarking
+os.environ.setdefault('SNAPSHOT_DB', '')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('suite', nargs='?', default='all', choices=('all', 'micro', 'load', 'compare'))
+    parser.add_argument('files', nargs='*', help='baseline and current result files for "compare"')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='catalogue sizes for the micro-benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='timing rounds per micro-benchmark')
+    parser.add_argument('--load-size', type=int, default=10000, help='catalogue size for the load test')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per endpoint in the load test')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads in the load test')
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare this run against a saved result file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown that counts as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    from benchmarks.report import Results, compare, load_results, print_comparison
+
+    if args.suite == 'compare':
+        if len(args.files) != 2:
+            parser.error('compare needs a baseline and a current result file')
+        rows = compare(load_results(args.files[0]), load_results(args.files[1]), args.threshold)
+        sys.exit(1 if print_comparison(rows, args.threshold) else 0)
+
+    import logging
+    from benchmarks import load, micro
+    # app configures INFO logging on import; publishing benchmark snapshots should stay quiet
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = Results()
+    if args.suite in ('all', 'micro'):
+        micro.run(results, args.sizes, args.repeat)
+    if args.suite in ('all', 'load'):
+        load.run(results, args.load_size, args.requests, args.concurrency)
+
+    if args.json:
+        results.write(args.json, vars(args))
+        print(f"\nwrote {len(results.metrics)} metrics to {args.json}")
+    if args.compare:
+        print()
+        rows = compare(load_results(args.compare), results.metrics, args.threshold)
+        sys.exit(1 if print_comparison(rows, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
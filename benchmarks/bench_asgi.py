@@ -0,0 +1,147 @@
+"""Throughput of the Flask app and the ASGI entry point side by side, under the same load
+
+Both servers run in-process over the same synthetic catalogue and are driven by
+the same client threads as the load test. Every scenario is first checked to
+return identical JSON from both; the health check is skipped because it is
+timestamped. The "during refresh" pass keeps a refresh loop republishing the
+catalogue while the clients poll, so the caches keep getting invalidated.
+
+Run from the repository root:
+
+    SNAPSHOT_DB= python -m benchmarks.bench_asgi --size 10000 --requests 2000 --concurrency 32
+"""
+import argparse
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+import app
+import asgi
+from asgi_server import Server
+from benchmarks.catalogue import generate_products
+from benchmarks.load import SCENARIOS, LocalServer, hammer
+from benchmarks.report import percentile
+from ingest import ingest_products
+
+
+class AsgiServer:
+    """Serve asgi:app on an ephemeral localhost port from a background thread"""
+
+    def __init__(self):
+        self.server = Server(asgi.app, host='127.0.0.1', port=0)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        self.server.started.wait(30)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join(10)
+
+
+def republishing(products, seconds):
+    """A refresh loader that takes a while and always publishes a new version"""
+    def loader(force=False):
+        time.sleep(seconds)
+        return list(products)
+    return loader
+
+
+def check_identical(flask_url, asgi_url, paths):
+    session = requests.Session()
+    for path in paths:
+        flask_body = session.get(flask_url + path).content
+        asgi_body = session.get(asgi_url + path).content
+        if flask_body != asgi_body:
+            raise SystemExit(f"responses differ for {path}")
+    session.close()
+
+
+def measure(base_url, template, ids, cursor, requests_per_client, concurrency):
+    def url_for(rng):
+        return base_url + template.format(id=rng.choice(ids), cursor=cursor)
+
+    hammer(url_for, 2, concurrency)
+    latencies, wall, errors = hammer(url_for, requests_per_client, concurrency)
+    return len(latencies) / wall, percentile(latencies, 0.50), percentile(latencies, 0.99), errors
+
+
+@contextmanager
+def refreshing(base_url, enabled=True):
+    """Keep requesting refreshes from base_url for the duration of the block"""
+    stop = threading.Event()
+
+    def loop():
+        session = requests.Session()
+        while not stop.is_set():
+            session.post(base_url + '/api/refresh')
+            stop.wait(0.05)
+        session.close()
+
+    thread = threading.Thread(target=loop, daemon=True)
+    if enabled:
+        thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        if enabled:
+            thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario and server')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--refresh-seconds', type=float, default=0.5, help='duration of each simulated refresh')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    products = ingest_products(generate_products(args.size))
+    snapshot = app.snapshot_store.publish(products)
+    ids = list(snapshot.by_id)
+    cursor = app.app.test_client().get('/api/products?page_size=50').get_json()['pagination']['next_cursor']
+    per_client = max(1, args.requests // args.concurrency)
+    loader = republishing(products, args.refresh_seconds)
+    app.refresher.loader = loader
+    asgi.refresher.loader = loader
+
+    print(f"{args.size} products, {per_client * args.concurrency} requests per scenario, "
+          f"{args.concurrency} clients")
+    print(f"{'scenario':<40}{'flask req/s':>12}{'asgi req/s':>12}{'flask p50':>11}{'asgi p50':>10}"
+          f"{'flask p99':>11}{'asgi p99':>10}{'errors':>8}")
+    with LocalServer(app.app) as flask_server, AsgiServer() as asgi_server:
+        app.refresher.start()
+        for phase in ('idle', 'during refresh'):
+            for label, template in SCENARIOS:
+                # Cursors are bound to the snapshot they were issued from and expire on every publish
+                if phase != 'idle' and '{cursor}' in template:
+                    continue
+                # The health check carries its own timestamp, so only its shape can match
+                if phase == 'idle' and label != 'health_check':
+                    paths = {template.format(id=product_id, cursor=cursor) for product_id in ids[:5]}
+                    check_identical(flask_server.base_url, asgi_server.base_url, sorted(paths))
+                rows = []
+                for server in (flask_server, asgi_server):
+                    with refreshing(server.base_url, enabled=phase != 'idle'):
+                        rows.append(measure(server.base_url, template, ids, cursor, per_client, args.concurrency))
+                (flask_rps, flask_p50, flask_p99, flask_errors), (asgi_rps, asgi_p50, asgi_p99, asgi_errors) = rows
+                print(f"{label + ' (' + phase + ')':<40}{flask_rps:>12.0f}{asgi_rps:>12.0f}"
+                      f"{flask_p50 * 1000:>9.2f}ms{asgi_p50 * 1000:>8.2f}ms"
+                      f"{flask_p99 * 1000:>9.2f}ms{asgi_p99 * 1000:>8.2f}ms{flask_errors + asgi_errors:>8}")
+    app.refresher.stop(5)
+
+
+if __name__ == '__main__':
+    main()
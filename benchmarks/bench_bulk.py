@@ -0,0 +1,193 @@
+"""Bulk import and export throughput on a generated feed, each stage in its own process so peak memory is its own
+
+    pipeline   bulk.import_feed over the file: read, validate, normalize and dedupe in chunks
+    load-all   the same rows parsed into one list before ingesting, to compare peak memory
+    publish    the pipeline, then storing the imports in a temporary SNAPSHOT_DB, publishing
+               the merged snapshot (search, price and facet indexes), saving it, and streaming
+               it back out as NDJSON and CSV
+
+Peak is the growth of the process high-water mark over its size before the stage;
+retained is what the imported products still hold afterwards.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bulk --rows 1000000
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.catalogue import generate_products
+
+os.environ.setdefault('SNAPSHOT_DB', '')
+
+GENERATE_BATCH = 100000
+
+
+def memory():
+    """(current RSS, peak RSS) of this process in bytes"""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                values[line.split(':')[0]] = int(line.split()[1]) * 1024
+    return values['VmRSS'], values['VmHWM']
+
+
+def feed_rows(rows):
+    """Feed records shaped like a partner catalogue: no ids, unique links, prices as scraped"""
+    for offset in range(0, rows, GENERATE_BATCH):
+        for record in generate_products(min(GENERATE_BATCH, rows - offset), seed=offset):
+            position = offset + record.pop('id')
+            record['link'] = f"{record['link'].rsplit('/', 1)[0]}/{position}"
+            yield record
+
+
+def write_feeds(directory, rows):
+    import csv
+
+    ndjson_path = os.path.join(directory, 'feed.ndjson')
+    csv_path = os.path.join(directory, 'feed.csv')
+    fields = ('title', 'description', 'price', 'category', 'link', 'source')
+    with open(ndjson_path, 'w') as ndjson_file, open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(fields)
+        for record in feed_rows(rows):
+            ndjson_file.write(json.dumps(record) + '\n')
+            writer.writerow([record[field] for field in fields])
+    return ndjson_path, csv_path
+
+
+def run_pipeline(path, fmt):
+    from bulk import import_feed
+
+    with open(path, 'rb') as stream:
+        return import_feed(stream, fmt)
+
+
+def stage_pipeline(path, fmt):
+    rss, _ = memory()
+    products, report = run_pipeline(path, fmt)
+    after, peak = memory()
+    return {'seconds': report.seconds, 'rows': report.rows, 'imported': report.imported,
+            'peak': peak - rss, 'retained': after - rss}
+
+
+def stage_load_all(path, fmt):
+    from ingest import ingest_products
+
+    rss, _ = memory()
+    started = time.perf_counter()
+    with open(path, 'rb') as stream:
+        records = [json.loads(line) for line in stream]
+    products = ingest_products(records)
+    seconds = time.perf_counter() - started
+    del records
+    after, peak = memory()
+    return {'seconds': seconds, 'rows': len(products), 'imported': len(products),
+            'peak': peak - rss, 'retained': after - rss}
+
+
+def stage_publish(path, fmt):
+    import app
+    from persistence import SnapshotDatabase
+
+    # app configures INFO logging on import
+    logging.getLogger().setLevel(logging.WARNING)
+    # Everything stays offline: no source is due, so a refresh only merges the imports
+    app.source_registry.refresh = lambda *args, **kwargs: []
+    products, _ = run_pipeline(path, fmt)
+    result = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = SnapshotDatabase(os.path.join(directory, 'products.db'))
+        app.imported_catalogue.database = database
+        started = time.perf_counter()
+        app.imported_catalogue.apply(products, 'replace')
+        result['store_imports'] = time.perf_counter() - started
+        del products
+
+        started = time.perf_counter()
+        merged = app.scrape_tech_products()
+        result['merge'] = time.perf_counter() - started
+        started = time.perf_counter()
+        snapshot = app.snapshot_store.publish(merged)
+        result['publish'] = time.perf_counter() - started
+        started = time.perf_counter()
+        database.save(snapshot)
+        result['save_snapshot'] = time.perf_counter() - started
+        result['snapshot_products'] = len(snapshot)
+
+    for export_format in ('ndjson', 'csv'):
+        _, chunks = app.export_feed(snapshot.products, export_format)
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in chunks)
+        result[f"export_{export_format}"] = time.perf_counter() - started
+        result[f"export_{export_format}_bytes"] = size
+    return result
+
+
+STAGES = {
+    'pipeline': stage_pipeline,
+    'load-all': stage_load_all,
+    'publish': stage_publish
+}
+
+
+def run_stage(stage, path, fmt):
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_bulk', '--stage', stage, '--file', path, '--format', fmt],
+        stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout.decode().strip().splitlines()[-1])
+
+
+def mib(value):
+    return f"{value / 1024 / 1024:.0f} MiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--stage', choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    parser.add_argument('--format', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.stage:
+        print(json.dumps(STAGES[args.stage](args.file, args.format)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        ndjson_path, csv_path = write_feeds(directory, args.rows)
+        print(f"{args.rows} rows: {mib(os.path.getsize(ndjson_path))} NDJSON, {mib(os.path.getsize(csv_path))} CSV "
+              f"(generated in {time.perf_counter() - started:.1f}s)\n")
+
+        print(f"{'import':<24}{'seconds':>9}{'rows/s':>10}{'imported':>10}{'peak':>11}{'retained':>11}")
+        for label, stage, path, fmt in (('pipeline ndjson', 'pipeline', ndjson_path, 'ndjson'),
+                                        ('pipeline csv', 'pipeline', csv_path, 'csv'),
+                                        ('load-all ndjson', 'load-all', ndjson_path, 'ndjson')):
+            result = run_stage(stage, path, fmt)
+            print(f"{label:<24}{result['seconds']:>9.2f}{result['rows'] / result['seconds']:>10.0f}"
+                  f"{result['imported']:>10}{mib(result['peak']):>11}{mib(result['retained']):>11}")
+
+        result = run_stage('publish', ndjson_path, 'ndjson')
+        print(f"\npublish {result['snapshot_products']} products")
+        for label, key in (('store imports (SQLite)', 'store_imports'), ('refresh merge', 'merge'),
+                           ('publish (build indexes)', 'publish'), ('save snapshot (SQLite)', 'save_snapshot')):
+            print(f"  {label:<26}{result[key]:>8.2f} s")
+        print('\nexport')
+        for export_format in ('ndjson', 'csv'):
+            seconds = result[f"export_{export_format}"]
+            print(f"  {export_format:<26}{seconds:>8.2f} s {result['snapshot_products'] / seconds:>10.0f} rows/s "
+                  f"{mib(result[f'export_{export_format}_bytes']):>10}")
+
+
+if __name__ == '__main__':
+    main()
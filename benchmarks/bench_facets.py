@@ -0,0 +1,97 @@
+"""Facet counts from the snapshot bitmaps against tallying a filtered result, per page view
+
+The scan side is what a page view costs without facets: filter once per facet
+with that facet's own filter left out, then tally its values over the result.
+The bitmap side is one uncached facet_products call.
+
+Run from the repository root:
+
+    SNAPSHOT_DB= python -m benchmarks.bench_facets --sizes 10000 100000
+"""
+import argparse
+import time
+
+import app
+from aggregates import price_bucket
+from benchmarks.catalogue import generate_products
+from ingest import ingest_products
+from snapshot import Snapshot
+
+# (search, categories, price buckets, min price, max price)
+QUERIES = [
+    (None, (), (), None, None),
+    (None, ('laptop',), (), None, None),
+    ('pro', ('gaming', 'laptop'), (), None, None),
+    ('samsung', (), ('above_100k',), None, None),
+    (None, ('headphones',), (), 10000.0, 50000.0)
+]
+
+
+def tally(products, field):
+    counts = {}
+    for product in products:
+        value = price_bucket(product.price_value) if field == 'price_range' else getattr(product, field)
+        if value is not None:
+            counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+def scan(snapshot, search, categories, buckets, min_price, max_price):
+    """Results and facet counts by filtering and tallying, one pass per facet"""
+    def matching(skip):
+        products = app.filter_products(snapshot, search, None, min_price, max_price)
+        if categories and skip != 'category':
+            products = [product for product in products if product.category in categories]
+        if buckets and skip != 'price_range':
+            products = [product for product in products if price_bucket(product.price_value) in buckets]
+        return products
+
+    results = matching(None)
+    counts = {facet: tally(matching(facet), facet) for facet in ('category', 'source', 'price_range')}
+    return results, counts
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        app.query_cache.clear()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        start = time.perf_counter()
+        snapshot = Snapshot(ingest_products(generate_products(size)), version=size)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        snapshot.facet_index.__init__(snapshot.products)
+        facet_build = time.perf_counter() - start
+        print(f"\n{size} products (snapshot build {build * 1000:.1f} ms, of which facet bitmaps {facet_build * 1000:.1f} ms)")
+        print(f"{'query':<44}{'hits':>8}{'scan ms':>10}{'bitmap ms':>11}{'speedup':>9}")
+
+        for search, categories, buckets, min_price, max_price in QUERIES:
+            results, counts = scan(snapshot, search, categories, buckets, min_price, max_price)
+            app.query_cache.clear()
+            products, facets = app.facet_products(snapshot, search, categories, (), buckets, min_price, max_price)
+            assert {p.id for p in products} == {p.id for p in results}, f"result mismatch for {search!r}"
+            for facet, values in counts.items():
+                assert {k: v for k, v in facets[facet].items() if v} == values, f"{facet} counts differ for {search!r}"
+
+            scanned = best_of(lambda: scan(snapshot, search, categories, buckets, min_price, max_price), args.repeat)
+            bitmap = best_of(lambda: app.facet_products(snapshot, search, categories, (), buckets, min_price,
+                                                        max_price), args.repeat)
+            label = ' '.join(filter(None, [search, ','.join(categories), ','.join(buckets),
+                                           f"{min_price}-{max_price}" if min_price else None])) or '(everything)'
+            print(f"{label:<44}{len(products):>8}{scanned * 1000:>10.2f}{bitmap * 1000:>11.2f}{scanned / bitmap:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare the memory held by product dicts and Product records
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory --count 100000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.catalogue import generate_products
+from ingest import ingest_products
+from product import Product
+
+
+def measure(build):
+    """Bytes still allocated by whatever build() returns, once temporaries are freed"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    scraped_at = datetime.now().isoformat()
+    records = [product.to_dict() for product in ingest_products(generate_products(args.count))]
+    for record in records:
+        record['scraped_at'] = scraped_at
+    # Decode from JSON so every record owns its strings, as after a scrape or a load from disk
+    payload = json.dumps(records).encode('utf-8')
+    del records
+
+    dicts, dict_bytes = measure(lambda: json.loads(payload))
+    del dicts
+    products, product_bytes = measure(lambda: [Product.from_dict(data) for data in json.loads(payload)])
+    del products
+
+    print(f"{args.count} products")
+    print(f"dicts:   {dict_bytes / 2 ** 20:8.1f} MiB ({dict_bytes / args.count:6.0f} B/product)")
+    print(f"Product: {product_bytes / 2 ** 20:8.1f} MiB ({product_bytes / args.count:6.0f} B/product)")
+    print(f"saving:  {(1 - product_bytes / dict_bytes) * 100:8.1f}%")
+
+
+if __name__ == '__main__':
+    main()
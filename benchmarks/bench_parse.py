@@ -0,0 +1,66 @@
+"""Compare HTML parsing strategies over the saved Flipkart/Amazon fixtures
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parse --repeat 20 --pages 200 --processes 4
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.stub_server import load_fixture
+from parsers import parse_page, parse_pages
+
+FIXTURES = [
+    ('flipkart', 'flipkart_smartphone.html', 'smartphone'),
+    ('amazon', 'amazon_laptop.html', 'laptop')
+]
+
+
+def parse_full_tree(source_type, content, category, limit=5):
+    """The original approach: a full html.parser tree, then find_all/find per product"""
+    soup = BeautifulSoup(content, 'html.parser')
+    if source_type == 'flipkart':
+        items = soup.find_all('div', {'data-id': True})[:limit]
+        return [(item.find('a', class_='IRpwTa'), item.find('div', class_='_30jeq3')) for item in items]
+    items = soup.find_all('div', {'data-component-type': 's-search-result'})[:limit]
+    return [(item.find('h2'), item.find('span', class_='a-offscreen')) for item in items]
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=200, help='pages parsed in the pool comparison')
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'page':<10}{'KiB':>6}{'html.parser ms':>16}{'soup+strainer ms':>18}{'lxml xpath ms':>15}")
+    for source_type, name, category in FIXTURES:
+        content = load_fixture(name)
+        full = best_of(lambda: parse_full_tree(source_type, content, category), args.repeat)
+        soup = best_of(lambda: parse_page(source_type, content, category, parser='soup'), args.repeat)
+        lxml = best_of(lambda: parse_page(source_type, content, category, parser='lxml'), args.repeat)
+        print(f"{source_type:<10}{len(content) / 1024:>6.0f}{full * 1000:>16.2f}{soup * 1000:>18.2f}{lxml * 1000:>15.2f}")
+
+    pages = [(source_type, load_fixture(name), category, 5) for source_type, name, category in FIXTURES]
+    pages = (pages * (args.pages // len(pages) + 1))[:args.pages]
+    parse_pages(pages[:args.processes * 2], processes=args.processes)  # start the pool outside the timing
+
+    serial = best_of(lambda: parse_pages(pages), 3)
+    pooled = best_of(lambda: parse_pages(pages, processes=args.processes), 3)
+    print(f"\n{args.pages} pages with lxml: in-process {serial * 1000:.0f} ms, "
+          f"{args.processes} processes {pooled * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Replay the frontend's repeated category and search queries with and without the query cache
+
+Run from the repository root:
+
+    SNAPSHOT_DB= python -m benchmarks.bench_query_cache --size 100000 --requests 2000
+"""
+import argparse
+import random
+import time
+
+import app
+from benchmarks.catalogue import generate_products
+from ingest import ingest_products
+
+# What index.html sends: the category buttons, a few searches and the price sort
+FRONTEND_QUERIES = [
+    (None, None, None), (None, 'smartphone', None), (None, 'laptop', None), (None, 'headphones', None),
+    (None, 'gaming', None), (None, 'accessories', None), ('pro', None, None), ('samsung', None, None),
+    ('noise cancellation', None, None), ('pro', 'laptop', 'price'), (None, None, '-price')
+]
+
+
+def replay(filter_fn, snapshot, queries):
+    start = time.perf_counter()
+    for search, category, sort in queries:
+        filter_fn(snapshot, search=search, category=category, sort=sort)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    snapshot = app.snapshot_store.publish(ingest_products(generate_products(args.size)))
+    rng = random.Random(1)
+    queries = [rng.choice(FRONTEND_QUERIES) for _ in range(args.requests)]
+
+    uncached = replay(app.filter_products, snapshot, queries)
+    cached = replay(app.cached_filter_products, snapshot, queries)
+    stats = app.query_cache.stats()
+
+    print(f"{args.size} products, {args.requests} requests over {len(FRONTEND_QUERIES)} distinct queries")
+    print(f"{'mode':<12}{'total ms':>12}{'per request ms':>16}")
+    print(f"{'uncached':<12}{uncached * 1000:>12.1f}{uncached * 1000 / args.requests:>16.3f}")
+    print(f"{'memoized':<12}{cached * 1000:>12.1f}{cached * 1000 / args.requests:>16.3f}")
+    print(f"hits {stats['hits']}, misses {stats['misses']}, hit ratio {stats['hit_ratio']}")
+
+
+if __name__ == '__main__':
+    main()
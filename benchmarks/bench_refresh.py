@@ -0,0 +1,62 @@
+"""Time source refreshes when nothing changed, when one source changed and when every page is refetched
+
+Run from the repository root:
+
+    python -m benchmarks.bench_refresh --sources 8 --latency 0.05
+"""
+import argparse
+import contextlib
+import time
+
+from scraper import ScrapeEngine
+from sources import SourceAdapter, SourceRegistry
+from benchmarks.stub_server import StubServer
+
+
+def build_registry(servers):
+    """One Flipkart or Amazon source per stub host, each with a cadence of zero so every tick is due"""
+    registry = SourceRegistry()
+    for i, server in enumerate(servers):
+        if i % 2 == 0:
+            url, parser, category = f"{server.base_url}/search?q=smartphone", 'flipkart', 'smartphone'
+        else:
+            url, parser, category = f"{server.base_url}/s?k=laptop", 'amazon', 'laptop'
+        registry.register(SourceAdapter(f"source-{i}", url, parser, category, refresh_interval=0, limit=40))
+    return registry
+
+
+def timed(registry, engine):
+    start = time.perf_counter()
+    changed = registry.refresh(engine)
+    products = registry.products()
+    return time.perf_counter() - start, len(changed), len(products)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sources', type=int, default=8, help='number of stub hosts, one source each')
+    parser.add_argument('--latency', type=float, default=0.05, help='per-request latency of each host in seconds')
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        servers = [stack.enter_context(StubServer(args.latency)) for _ in range(args.sources)]
+        registry = build_registry(servers)
+        engine = ScrapeEngine(max_workers=args.sources, rate=1000, burst=10)
+        stack.callback(engine.close)
+
+        rows = [('first fetch', *timed(registry, engine))]
+        rows.append(('nothing changed (304s)', *timed(registry, engine)))
+        servers[0].touch('/search')
+        rows.append(('one source changed', *timed(registry, engine)))
+        for state in registry.states.values():
+            state.validators.clear()
+        rows.append(('unconditional refetch', *timed(registry, engine)))
+
+        print(f"{args.sources} sources, latency {args.latency}s")
+        print(f"{'refresh':<24}{'seconds':>10}{'changed':>10}{'products':>10}")
+        for label, elapsed, changed, products in rows:
+            print(f"{label:<24}{elapsed:>10.3f}{changed:>10}{products:>10}")
+
+
+if __name__ == '__main__':
+    main()
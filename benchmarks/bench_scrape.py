@@ -0,0 +1,74 @@
+"""Compare the sequential scraper against ScrapeEngine on local stub hosts
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scrape --hosts 4 --latency 0.2
+"""
+import argparse
+import contextlib
+import time
+
+import requests
+
+from scraper import DEFAULT_HEADERS, ScrapeEngine
+from benchmarks.stub_server import StubServer
+
+
+def build_sources(servers):
+    """Alternate Flipkart and Amazon pages across the stub hosts"""
+    sources = []
+    for i, server in enumerate(servers):
+        if i % 2 == 0:
+            sources.append({'url': f"{server.base_url}/search?q=smartphone", 'type': 'flipkart', 'category': 'smartphone'})
+        else:
+            sources.append({'url': f"{server.base_url}/s?k=laptop", 'type': 'amazon', 'category': 'laptop'})
+    return sources
+
+
+def run_sequential(sources, delay):
+    """The original loop: one fresh connection per source and a fixed sleep between sources"""
+    start = time.perf_counter()
+    for source in sources:
+        response = requests.get(source['url'], headers=DEFAULT_HEADERS, timeout=10)
+        response.raise_for_status()
+        time.sleep(delay)
+    return time.perf_counter() - start
+
+
+def run_engine(engine, sources):
+    start = time.perf_counter()
+    results = engine.fetch_all(sources)
+    elapsed = time.perf_counter() - start
+    assert all(response is not None for _, response in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=4, help='number of stub hosts')
+    parser.add_argument('--latency', type=float, default=0.2, help='per-request latency of each host in seconds')
+    parser.add_argument('--slow-latency', type=float, default=0.5, help='latency of the slowest host in seconds')
+    parser.add_argument('--delay', type=float, default=2.0, help='sleep between sources in the sequential baseline')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    latencies = [args.latency] * (args.hosts - 1) + [args.slow_latency]
+    with contextlib.ExitStack() as stack:
+        servers = [stack.enter_context(StubServer(latency)) for latency in latencies]
+        sources = build_sources(servers)
+
+        engine = ScrapeEngine(max_workers=args.hosts, rate=1.0, burst=1)
+        stack.callback(engine.close)
+
+        print(f"{args.hosts} hosts, latency {args.latency}s (slowest {args.slow_latency}s)")
+        sequential = run_sequential(sources, args.delay)
+        print(f"sequential + {args.delay}s sleep: {sequential:.3f}s")
+
+        for round_no in range(1, args.rounds + 1):
+            elapsed = run_engine(engine, sources)
+            print(f"engine round {round_no}: {elapsed:.3f}s")
+            time.sleep(1.0)
+
+
+if __name__ == '__main__':
+    main()
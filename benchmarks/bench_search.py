@@ -0,0 +1,96 @@
+"""Compare the linear product filter against the snapshot search index, and time typo-tolerant search
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+from benchmarks.catalogue import generate_products
+from ingest import ingest_products
+from snapshot import Snapshot
+
+QUERIES = [
+    ('pro', None),
+    ('samsung', None),
+    ('battery', 'laptop'),
+    ('noise cancellation', None),
+    ('titan', 'smartphone'),
+    ('zz', None),
+    (None, 'gaming')
+]
+
+# (query with typos, term that the top hit must contain)
+FUZZY_QUERIES = [
+    ('samsnug', 'samsung'),
+    ('aple', 'apple'),
+    ('sennhieser', 'sennheiser'),
+    ('keychorn', 'keychron'),
+    ('titna', 'titan'),
+    ('noise cancelation', 'noise')
+]
+
+
+def linear_filter_products(products, search=None, category=None):
+    """The original filter_products scan, kept as the baseline"""
+    filtered = list(products)
+    if search:
+        search_lower = search.lower()
+        filtered = [p for p in filtered if (
+            search_lower in p['title'].lower() or
+            search_lower in p['description'].lower() or
+            search_lower in p['category'].lower()
+        )]
+    if category and category != 'all':
+        filtered = [p for p in filtered if p['category'] == category]
+    return filtered
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        products = generate_products(size)
+        start = time.perf_counter()
+        snapshot = Snapshot(ingest_products(products))
+        build = time.perf_counter() - start
+        index = snapshot.search_index
+        print(f"\n{size} products (snapshot build {build * 1000:.1f} ms)")
+        print(f"{'query':<28}{'hits':>8}{'linear ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        for search, category in QUERIES:
+            expected = {p['link'] for p in linear_filter_products(products, search, category)}
+            actual = {snapshot.products[pos].link for pos in index.search(search, category)}
+            assert expected == actual, f"result mismatch for {search!r}/{category!r}"
+
+            linear = best_of(lambda: linear_filter_products(products, search, category), args.repeat)
+            indexed = best_of(lambda: index.search(search, category), args.repeat)
+            label = f"{search or '-'} / {category or 'all'}"
+            print(f"{label:<28}{len(expected):>8}{linear * 1000:>12.3f}{indexed * 1000:>12.3f}{linear / indexed:>9.1f}x")
+
+        print(f"{'fuzzy query':<28}{'hits':>8}{'terms ms':>12}{'search ms':>12}  top hit")
+        for search, expected_term in FUZZY_QUERIES:
+            positions = index.fuzzy_search(search)
+            top = snapshot.products[positions[0]]
+            assert expected_term in f"{top.title} {top.description}".lower(), f"bad top hit for {search!r}"
+
+            expand = best_of(lambda: [index.similar_terms(term) for term in search.split()], args.repeat)
+            fuzzy = best_of(lambda: index.fuzzy_search(search), args.repeat)
+            print(f"{search:<28}{len(positions):>8}{expand * 1000:>12.3f}{fuzzy * 1000:>12.3f}  {top.title}")
+
+
+if __name__ == '__main__':
+    main()
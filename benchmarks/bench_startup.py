@@ -0,0 +1,63 @@
+"""Measure cold start (scrape) against warm start (persisted snapshot)
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --sizes 20 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.catalogue import generate_products
+from benchmarks.stub_server import StubServer
+from ingest import ingest_products
+from persistence import SnapshotDatabase
+from scraper import ScrapeEngine
+from snapshot import Snapshot
+
+
+def cold_start(base_url):
+    """Fetch and parse the canned pages, then build a snapshot, as a first start does"""
+    engine = ScrapeEngine(max_workers=2, rate=10)
+    try:
+        start = time.perf_counter()
+        sources = [{'url': f"{base_url}/search?q=smartphone"}, {'url': f"{base_url}/s?k=laptop"}]
+        for _, response in engine.fetch_all(sources):
+            BeautifulSoup(response.content, 'html.parser').find_all('div', {'data-id': True})
+        Snapshot(ingest_products(generate_products(20)), 1)
+        return time.perf_counter() - start
+    finally:
+        engine.close()
+
+
+def warm_start(db):
+    """Load the newest persisted snapshot and build its indexes"""
+    start = time.perf_counter()
+    version, published_at, products = db.load()
+    loaded = time.perf_counter()
+    Snapshot(products, version, published_at)
+    return loaded - start, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 1000, 10000, 100000])
+    parser.add_argument('--latency', type=float, default=0.5, help='simulated latency of the scraped sites')
+    args = parser.parse_args()
+
+    with StubServer(args.latency) as server:
+        print(f"cold start (scrape at {args.latency}s latency, 20 products): {cold_start(server.base_url) * 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            db = SnapshotDatabase(os.path.join(tmp, f"products-{size}.db"))
+            db.save(Snapshot(ingest_products(generate_products(size)), 1))
+            load, total = warm_start(db)
+            print(f"warm start {size:>7} products: load {load * 1000:8.1f} ms, ready {total * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Hold thousands of idle /api/stream clients on the ASGI server and time how fast a publish reaches them
+
+The server and the clients share one process. Thread count is sampled before
+and after connecting, to show that idle clients add no threads. Memory is the
+growth of the process RSS, which includes the client sockets as well.
+
+Run from the repository root:
+
+    SNAPSHOT_DB= python -m benchmarks.bench_stream --clients 2000 --size 10000 --changed 20
+"""
+import argparse
+import asyncio
+import logging
+import threading
+import time
+
+import app
+import asgi
+from benchmarks.bench_asgi import AsgiServer
+from benchmarks.catalogue import generate_products
+from benchmarks.report import percentile
+from ingest import ingest_products
+from response_cache import serialize_json
+
+
+def rss_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def open_stream(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /api/stream HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await reader.readuntil(b'event: snapshot')
+    return reader, writer
+
+
+async def wait_for_diff(reader):
+    await reader.readuntil(b'event: diff')
+    received = time.perf_counter()
+    await reader.readuntil(b'\n\n')
+    return received
+
+
+async def run(port, clients, publish):
+    start = time.perf_counter()
+    streams = []
+    for offset in range(0, clients, 200):
+        streams += await asyncio.gather(*(open_stream(port) for _ in range(min(200, clients - offset))))
+    connect_seconds = time.perf_counter() - start
+    threads, rss = threading.active_count(), rss_bytes()
+
+    waiters = [asyncio.ensure_future(wait_for_diff(reader)) for reader, _ in streams]
+    published = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, publish)
+    built = time.perf_counter() - published
+    received = await asyncio.gather(*waiters)
+    for _, writer in streams:
+        writer.close()
+    return connect_seconds, threads, rss, built, sorted(moment - published for moment in received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--changed', type=int, default=20, help='products removed by the measured publish')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    products = ingest_products(generate_products(args.size))
+    snapshot = app.snapshot_store.publish(products)
+    listing_bytes = len(app.app.test_client().get('/api/products').data)
+
+    with AsgiServer() as server:
+        threads_before, rss_before = threading.active_count(), rss_bytes()
+        connect_seconds, threads_after, rss_after, built, latencies = asyncio.run(
+            run(server.server.port, args.clients, lambda: app.snapshot_store.publish(products[args.changed:])))
+        diff = asgi.broadcaster.frames[-1][2]
+
+    print(f"{args.clients} stream clients, {args.size} products, publish removing {args.changed}")
+    print(f"connect all clients      {connect_seconds * 1000:>10.1f} ms")
+    print(f"threads                  {threads_before:>10} before, {threads_after} with every client connected")
+    print(f"process RSS growth       {(rss_after - rss_before) / args.clients / 1024:>10.1f} KiB per client")
+    print(f"publish (build snapshot) {built * 1000:>10.1f} ms")
+    print(f"publish -> client p50    {percentile(latencies, 0.50) * 1000:>10.1f} ms")
+    print(f"publish -> client p99    {percentile(latencies, 0.99) * 1000:>10.1f} ms")
+    print(f"publish -> last client   {latencies[-1] * 1000:>10.1f} ms")
+    print(f"diff frame               {len(diff):>10} bytes per client")
+    print(f"full /api/products poll  {listing_bytes:>10} bytes per client "
+          f"({len(serialize_json(snapshot.products[:1]))} bytes per product)")
+
+
+if __name__ == '__main__':
+    main()
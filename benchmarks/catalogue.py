@@ -0,0 +1,56 @@
+"""Synthetic catalogues shaped like FALLBACK_DATA"""
+import random
+
+BRANDS = {
+    'smartphone': ['Apple', 'Samsung', 'Google', 'OnePlus', 'Xiaomi', 'Motorola', 'Nothing', 'Vivo', 'Oppo', 'Realme'],
+    'laptop': ['Dell', 'HP', 'Lenovo', 'ASUS', 'Acer', 'Apple', 'Microsoft', 'MSI', 'Razer', 'Samsung'],
+    'headphones': ['Sony', 'Bose', 'JBL', 'Sennheiser', 'Apple', 'Skullcandy', 'Audio-Technica', 'Beats'],
+    'gaming': ['NVIDIA', 'AMD', 'PlayStation', 'Xbox', 'Nintendo', 'Razer', 'Logitech', 'Corsair', 'ASUS'],
+    'accessories': ['Logitech', 'Anker', 'Belkin', 'Apple', 'Samsung', 'SanDisk', 'Keychron', 'Ugreen']
+}
+
+MODELS = ['Pro', 'Max', 'Ultra', 'Plus', 'Lite', 'Air', 'Neo', 'Edge', 'Prime', 'Zenith', 'Nova', 'Titan']
+
+FEATURES = [
+    'noise cancellation', 'all-day battery life', 'fast charging', 'AI-powered features', 'ray tracing',
+    'Liquid Retina display', 'titanium design', 'wireless connectivity', 'ultra-lightweight design',
+    'advanced camera system', 'premium build quality', 'spatial audio', '240Hz refresh rate', 'IP67 rating'
+]
+
+CURRENCIES = ['AED {}', 'Rs. {}', '${}', 'USD {}', 'INR {}']
+
+
+def format_amount(amount):
+    """Group digits the same way the scraped Indian listings do"""
+    digits = str(amount)
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return ','.join(groups + [tail])
+
+
+def generate_products(count, seed=42):
+    """Build count FALLBACK_DATA-shaped product dicts, deterministic for a given seed"""
+    rng = random.Random(seed)
+    categories = list(BRANDS)
+    products = []
+    for i in range(count):
+        category = rng.choice(categories)
+        brand = rng.choice(BRANDS[category])
+        title = f"{brand} {rng.choice(MODELS)} {rng.randint(1, 99)}{rng.choice(['', 'X', 'S', 'G', 'Z'])}"
+        description = (f"{category.capitalize()} with {rng.choice(FEATURES)}, "
+                       f"{rng.choice(FEATURES)} and {rng.choice(FEATURES)}.")
+        products.append({
+            'id': i + 1,
+            'title': title,
+            'description': description,
+            'price': rng.choice(CURRENCIES).format(format_amount(rng.randint(499, 499999))),
+            'category': category,
+            'link': f"https://example.com/{category}/{brand.lower()}/{i + 1}",
+            'source': brand
+        })
+    return products
@@ -0,0 +1,105 @@
+"""In-process load test: the Flask app behind a local threaded WSGI server, hammered by client threads"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+import app
+from benchmarks.catalogue import generate_products
+from benchmarks.report import percentile
+from ingest import ingest_products
+
+# (endpoint label, path template); {id} is filled with a random product id per request
+SCENARIOS = [
+    ('get_products_page', '/api/products?page_size=50'),
+    ('get_products_category', '/api/products?category=laptop&page_size=50'),
+    ('get_products_search', '/api/products?search=pro&sort=price&page_size=50'),
+    ('get_products_cursor', '/api/products?cursor={cursor}&page_size=50'),
+    ('get_product', '/api/products/{id}'),
+    ('get_categories', '/api/categories'),
+    ('get_stats', '/api/stats'),
+    ('health_check', '/api/health')
+]
+
+
+class LocalServer:
+    """Serve the app on an ephemeral localhost port from a background thread"""
+
+    def __init__(self, wsgi_app):
+        self.server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+def hammer(url_for, requests_per_client, concurrency):
+    """Issue requests from concurrency client threads; return sorted latencies, wall time and error count"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        local, failed = [], 0
+        for _ in range(requests_per_client):
+            url = url_for(rng)
+            start = time.perf_counter()
+            response = session.get(url)
+            local.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                failed += 1
+        session.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return sorted(latencies), wall, errors[0]
+
+
+def run(results, size, requests_per_endpoint, concurrency, wsgi_app=None):
+    """Publish a synthetic catalogue and load test every scenario against it"""
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    snapshot = app.snapshot_store.publish(ingest_products(generate_products(size)))
+    ids = list(snapshot.by_id)
+    first_page = app.app.test_client().get('/api/products?page_size=50').get_json()
+    cursor = first_page['pagination']['next_cursor']
+    per_client = max(1, requests_per_endpoint // concurrency)
+
+    print(f"load test: {size} products, {per_client * concurrency} requests per endpoint, "
+          f"{concurrency} clients")
+    print(f"{'endpoint':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    with LocalServer(wsgi_app or app.app) as server:
+        for label, template in SCENARIOS:
+            def url_for(rng, template=template):
+                return server.base_url + template.format(id=rng.choice(ids), cursor=cursor)
+
+            hammer(url_for, 2, concurrency)
+            latencies, wall, errors = hammer(url_for, per_client, concurrency)
+            throughput = len(latencies) / wall
+            p50, p95, p99 = (percentile(latencies, fraction) for fraction in (0.50, 0.95, 0.99))
+            results.add(f"load.{label}.rps", throughput, 'req/s', better='higher')
+            results.add(f"load.{label}.p50", p50, 's')
+            results.add(f"load.{label}.p95", p95, 's')
+            results.add(f"load.{label}.p99", p99, 's')
+            results.add(f"load.{label}.errors", errors, 'requests')
+            print(f"{label:<24}{throughput:>10.0f}{p50 * 1000:>10.2f}{p95 * 1000:>10.2f}{p99 * 1000:>10.2f}{errors:>8}")
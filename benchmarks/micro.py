@@ -0,0 +1,62 @@
+"""Micro-benchmarks of the per-request hot paths over synthetic catalogues"""
+import random
+
+import app
+from aggregates import Aggregates
+from benchmarks.catalogue import generate_products
+from benchmarks.report import time_op
+from ingest import ingest_products, parse_price
+from response_cache import serialize_json
+from snapshot import Snapshot
+
+FILTER_QUERIES = {
+    'all': {},
+    'category': {'category': 'laptop'},
+    'search': {'search': 'pro'},
+    'search_phrase': {'search': 'noise cancellation'},
+    'price_range': {'min_price': 10000.0, 'max_price': 50000.0},
+    'sort_price': {'sort': 'price'},
+    'combined': {'search': 'pro', 'category': 'laptop', 'max_price': 100000.0, 'sort': '-price'}
+}
+
+PAGE_SIZE = 50
+
+
+def bench_size(results, size, repeat):
+    """Record every micro-benchmark for one catalogue size"""
+    raw = generate_products(size)
+    products = ingest_products(raw)
+    snapshot = Snapshot(products, version=1)
+
+    for name, query in FILTER_QUERIES.items():
+        seconds = time_op(lambda: app.filter_products(snapshot, **query), repeat)
+        results.add(f"micro.filter_products.{name}.n={size}", seconds, 's/op')
+
+    prices = [product['price'] for product in random.Random(size).sample(raw, min(size, 1000))]
+    seconds = time_op(lambda: [app.extract_price(price) for price in prices], repeat)
+    results.add(f"micro.extract_price.n={size}", seconds / len(prices), 's/op')
+    seconds = time_op(lambda: [parse_price(price) for price in prices], repeat)
+    results.add(f"micro.parse_price.n={size}", seconds / len(prices), 's/op')
+
+    seconds = time_op(lambda: Aggregates(snapshot.products), repeat, min_time=0)
+    results.add(f"micro.aggregates_build.n={size}", seconds, 's/op')
+    seconds = time_op(lambda: app.stats_payload(snapshot), repeat)
+    results.add(f"micro.stats_payload.n={size}", seconds, 's/op')
+
+    page = {'success': True, 'data': snapshot.products[:PAGE_SIZE], 'total': PAGE_SIZE}
+    seconds = time_op(lambda: serialize_json(page), repeat)
+    results.add(f"micro.serialize_page.n={size}", seconds, 's/op')
+    listing = {'success': True, 'data': snapshot.products, 'total': size}
+    seconds = time_op(lambda: serialize_json(listing), repeat, min_time=0)
+    results.add(f"micro.serialize_listing.n={size}", seconds, 's/op')
+    results.add(f"micro.serialize_listing_per_product.n={size}", seconds / size, 's/op')
+
+
+def run(results, sizes, repeat=5):
+    print(f"{'micro-benchmark':<60}{'us/op':>14}")
+    for size in sizes:
+        recorded = set(results.metrics)
+        bench_size(results, size, repeat)
+        for name, metric in results.metrics.items():
+            if name not in recorded:
+                print(f"{name:<60}{metric['value'] * 1e6:>14.2f}")
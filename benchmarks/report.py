@@ -0,0 +1,94 @@
+"""Timing helpers and the machine-readable result format shared by the suite"""
+import json
+import math
+import platform
+import sys
+import time
+from datetime import datetime
+
+
+def time_op(fn, repeat=5, min_time=0.05):
+    """Best seconds per call of fn, calibrating the loop count so each round lasts at least min_time"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Results:
+    """Flat name -> measurement map; every measurement says which direction is better"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better='lower'):
+        self.metrics[name] = {'value': value, 'unit': unit, 'better': better}
+
+    def to_dict(self, args=None):
+        return {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'args': args or {}
+            },
+            'metrics': self.metrics
+        }
+
+    def write(self, path, args=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(args), f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['metrics']
+
+
+def compare(baseline, current, threshold):
+    """(name, baseline, current, change, regressed) rows for metrics present in both runs
+
+    change is the relative move in the "worse" direction, so a positive value
+    is a slowdown whichever way the metric is better.
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name]['value'], current[name]['value']
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        if current[name].get('better', 'lower') == 'higher':
+            change = -change
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"{'metric':<60}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<60}{before:>14.6g}{after:>14.6g}{change * 100:>9.1f}%{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"\n{regressions} regression(s) beyond {threshold * 100:.0f}% out of {len(rows)} compared metrics")
+    return regressions
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+FIXTURE_ROUTES = {
+    '/search': 'flipkart_smartphone.html',
+    '/s': 'amazon_laptop.html'
+}
+
+
+def load_fixture(name):
+    """Read a canned HTML page from the fixtures directory"""
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+def fixture_etag(body):
+    return '"' + hashlib.md5(body).hexdigest() + '"'
+
+
+class StubServer:
+    """Local HTTP server that serves canned Flipkart/Amazon pages with artificial latency and ETags"""
+
+    def __init__(self, latency=0.0):
+        pages = {path: load_fixture(name) for path, name in FIXTURE_ROUTES.items()}
+        self.pages = pages
+        server_latency = latency
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(server_latency)
+                body = pages.get(self.path.split('?')[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = fixture_etag(body)
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def touch(self, path):
+        """Change a page's content, and so its ETag, as if the site had updated it"""
+        self.pages[path] = self.pages[path] + b'\n'
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,464 @@
+"""Bulk import and export of catalogue data
+
+A feed is read as a pipeline of generators, one chunk of rows at a time:
+
+    read CSV/NDJSON rows -> validate -> normalize (stable ids, parsed prices) -> collect by id
+
+Only one chunk of raw rows is alive at once; what accumulates is the compact
+Product records of the feed. Imported products are kept in an ImportedCatalogue,
+persisted in SNAPSHOT_DB next to the snapshots, and every refresh publishes the
+scraped products followed by the imported ones, so an import survives later
+scrapes and restarts. Publishing that snapshot builds its search, price and
+facet indexes as usual.
+
+    python bulk.py import feed.csv.gz --mode replace --source Partner   # into SNAPSHOT_DB
+    python bulk.py import feed.ndjson --url http://localhost:5000        # through a running server
+    python bulk.py export --format csv --output catalogue.csv           # newest snapshot in SNAPSHOT_DB
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+
+from ingest import CURRENCY_CODES, PRICE_RE, dedupe_products, normalize_product
+from pagination import iter_csv, iter_ndjson
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 10000))
+IMPORT_FORMATS = ('ndjson', 'csv')
+IMPORT_MODES = ('merge', 'replace')
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', iter_ndjson),
+    'csv': ('text/csv', iter_csv)
+}
+
+TEXT_FIELDS = ('title', 'description', 'price', 'category', 'link', 'source')
+MAX_FIELD_CHARS = 10000
+MAX_REPORTED_ERRORS = 20
+MISSING_PRICE = 'Price not available'
+# A price written without a currency, which the currency default is prefixed to
+BARE_AMOUNT_RE = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+
+class ImportTooLarge(ValueError):
+    """A feed over the byte or row limit it was imported with"""
+
+
+class ByteLimit(io.RawIOBase):
+    """Raw stream that raises ImportTooLarge once more than limit bytes have been read from it"""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise ImportTooLarge(f"Feed is larger than {self.limit} bytes")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class ImportReport:
+    """Row counts of one import and the first few rows it rejected"""
+
+    def __init__(self, fmt):
+        self.format = fmt
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': str(error)})
+
+    def finish(self, imported):
+        self.imported = imported
+        self.duplicates = self.rows - self.rejected - imported
+        self.seconds = time.perf_counter() - self.started
+
+    def to_dict(self):
+        return {
+            'format': self.format,
+            'rows': self.rows,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3) if self.seconds is not None else None
+        }
+
+
+def read_ndjson(stream):
+    """(line number, raw line) for every non-blank line of a binary NDJSON stream"""
+    for line_no, line in enumerate(stream, 1):
+        if line.strip():
+            yield line_no, line
+
+
+def read_csv(stream):
+    """(line number, row dict) for every row of a binary UTF-8 CSV stream with a header row"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if not reader.fieldnames or 'title' not in reader.fieldnames:
+        raise ValueError('CSV feed needs a header row with at least a title column')
+    for row in reader:
+        yield reader.line_num, row
+
+
+READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv
+}
+
+
+def validate_record(record, defaults):
+    """Check one feed record and return the scraped-product dict it stands for, raising ValueError if it is unusable"""
+    if not isinstance(record, dict):
+        raise ValueError('record must be a JSON object')
+    product = {}
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if value is None:
+            continue
+        if field == 'price' and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        value = value.strip()
+        if len(value) > MAX_FIELD_CHARS:
+            raise ValueError(f"{field} is longer than {MAX_FIELD_CHARS} characters")
+        if value:
+            product[field] = value
+
+    if 'title' not in product:
+        raise ValueError('title is required')
+    category = product.get('category') or defaults.get('category')
+    if not category:
+        raise ValueError('category is required')
+    source = product.get('source') or defaults.get('source')
+    if not source:
+        raise ValueError('source is required')
+    product['category'] = category.lower()
+    product['source'] = source
+    product.setdefault('description', '')
+    product.setdefault('link', '')
+
+    price = product.get('price')
+    currency = record.get('currency') or defaults.get('currency') or ''
+    if not isinstance(currency, str):
+        raise ValueError('currency must be a string')
+    currency = currency.strip()
+    if price is None:
+        product['price'] = MISSING_PRICE
+    elif currency and not PRICE_RE.search(price):
+        if currency not in CURRENCY_CODES:
+            raise ValueError(f"Unknown currency {currency!r}")
+        # Anything else, such as "AED ," or "Call for price", is kept as written
+        if BARE_AMOUNT_RE.fullmatch(price):
+            product['price'] = f"{currency} {price}"
+
+    scraped_at = record.get('scraped_at')
+    if scraped_at not in (None, ''):
+        try:
+            if isinstance(scraped_at, bool):
+                raise TypeError(scraped_at)
+            seconds = scraped_at if isinstance(scraped_at, (int, float)) else datetime.fromisoformat(scraped_at).timestamp()
+            # Product.to_dict turns it back into a datetime, so it must be one this platform can represent
+            if not math.isfinite(seconds):
+                raise ValueError(seconds)
+            datetime.fromtimestamp(seconds)
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValueError('scraped_at must be an ISO timestamp or seconds since the epoch')
+        product['scraped_at'] = seconds
+    return product
+
+
+def chunks(rows, size):
+    """Group an iterable into lists of at most size items"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validated(row_chunks, defaults, report):
+    """Validate each chunk of (line, raw) rows into (line, record) pairs, recording the rejected ones on the report"""
+    loads = json.loads
+    for chunk in row_chunks:
+        report.rows += len(chunk)
+        records = []
+        for line, raw in chunk:
+            try:
+                records.append((line, validate_record(loads(raw) if isinstance(raw, bytes) else raw, defaults)))
+            except ValueError as e:
+                report.reject(line, e)
+        yield records
+
+
+def normalized(record_chunks, report):
+    """Turn each chunk of validated records into Products with stable ids and parsed prices
+
+    A record that still fails here is rejected on its own like a validation error.
+    """
+    for records in record_chunks:
+        products = []
+        for line, record in records:
+            try:
+                products.append(normalize_product(record))
+            except (ValueError, TypeError, KeyError) as e:
+                report.reject(line, f"could not normalize: {e}")
+        yield products
+
+
+def import_feed(stream, fmt='ndjson', defaults=None, chunk_size=IMPORT_CHUNK_SIZE, max_bytes=None, max_rows=None):
+    """Run a binary feed stream through the pipeline; return (products, report), keeping the first row of each id
+
+    With max_bytes or max_rows, a feed that reads past either limit raises ImportTooLarge.
+    """
+    if fmt not in READERS:
+        raise ValueError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    report = ImportReport(fmt)
+    if max_bytes is not None:
+        stream = io.BufferedReader(ByteLimit(stream, max_bytes))
+    rows = READERS[fmt](stream)
+    products = {}
+    try:
+        for chunk in normalized(validated(chunks(rows, chunk_size), defaults or {}, report), report):
+            if max_rows is not None and report.rows > max_rows:
+                raise ImportTooLarge(f"Feed has more than {max_rows} rows")
+            for product in chunk:
+                products.setdefault(product.id, product)
+    except (csv.Error, OSError, EOFError) as e:
+        # A broken stream (bad gzip, truncated upload, malformed CSV quoting) fails the whole import
+        raise ValueError(f"Unreadable {fmt} feed after {report.rows} rows: {e}")
+    report.finish(len(products))
+    logger.info(f"Imported {report.imported} of {report.rows} {fmt} rows in {report.seconds:.1f}s "
+                f"({report.rejected} rejected, {report.duplicates} duplicates)")
+    return list(products.values()), report
+
+
+def export_feed(products, fmt='ndjson'):
+    """(content type, chunk iterator) streaming products in an export format"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    content_type, encode = EXPORT_FORMATS[fmt]
+    return content_type, encode(products)
+
+
+class ImportedCatalogue:
+    """Products loaded by bulk imports, kept apart from the scraped ones and merged into every refresh
+
+    The version counts imports. Another process (a serve.py worker or the CLI)
+    may store a newer one in the database, which sync() picks up.
+    """
+
+    def __init__(self, database=None):
+        self.database = database
+        self.by_id = {}
+        self.version = 0
+        self.merged_version = 0
+        self.scraped = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def _load_newer(self):
+        if self.database and self.database.imports_version() > self.version:
+            version, products = self.database.load_imports()
+            self.by_id = {product.id: product for product in products}
+            self.version = version
+
+    def apply(self, products, mode='merge'):
+        """Replace the imported products, or merge into them with the new rows winning; return the new total"""
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"mode must be one of {', '.join(IMPORT_MODES)}")
+
+        def update(stored_version, load):
+            if mode == 'replace':
+                by_id = {}
+            elif stored_version == self.version:
+                by_id = dict(self.by_id)
+            else:
+                # Another process imported since we last looked; merge into what it stored
+                by_id = {product.id: product for product in load()}
+            for product in products:
+                by_id[product.id] = product
+            return list(by_id.values())
+
+        with self.lock:
+            if self.database:
+                version, merged = self.database.update_imports(update)
+            else:
+                version, merged = self.version + 1, update(self.version, list)
+            self.by_id = {product.id: product for product in merged}
+            self.version = version
+            return len(merged)
+
+    def sync(self):
+        """Pick up imports stored by another process; True when the imports changed since the last merge"""
+        with self.lock:
+            self._load_newer()
+            return self.version != self.merged_version
+
+    def merge(self, scraped):
+        """Scraped products followed by the imported ones; a scraped product wins an id both share
+
+        The scraped products are remembered, and stored in the database, for last_scraped().
+        """
+        scraped = list(scraped)
+        with self.lock:
+            imported = list(self.by_id.values())
+            self.merged_version = self.version
+            self.scraped = scraped
+        if self.database:
+            self.database.save_scraped(scraped)
+        return dedupe_products(scraped + imported) if imported else scraped
+
+    def last_scraped(self):
+        """The scraped products of the last merge, from this process or a stored one; empty when there was none"""
+        with self.lock:
+            scraped = self.scraped
+        if scraped is None and self.database:
+            scraped = self.database.load_scraped()
+            with self.lock:
+                if self.scraped is None:
+                    self.scraped = scraped
+        return list(scraped or ())
+
+    def stats(self):
+        return {
+            'products': len(self.by_id),
+            'version': self.version
+        }
+
+
+def feed_format(path, fmt=None):
+    """The format given, or the one a feed's file name implies"""
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'ndjson'
+
+
+def open_feed(path):
+    """Binary stream of a feed file, '-' for stdin, decompressed when the name ends in .gz"""
+    stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    return gzip.GzipFile(fileobj=stream) if path.endswith('.gz') else stream
+
+
+def defaults_from(args):
+    return {name: getattr(args, name) for name in ('source', 'category', 'currency') if getattr(args, name)}
+
+
+def upload(args, fmt):
+    """Stream the feed file as is to a running server's /api/import"""
+    import requests
+
+    headers = {'Content-Type': EXPORT_FORMATS[fmt][0]}
+    if args.file.endswith('.gz'):
+        headers['Content-Encoding'] = 'gzip'
+    token = args.token or os.environ.get('IMPORT_TOKEN')
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    params = dict(defaults_from(args), format=fmt, mode=args.mode)
+    with (sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')) as f:
+        response = requests.post(args.url.rstrip('/') + '/api/import', params=params, data=f, headers=headers)
+    print(json.dumps(response.json(), indent=2))
+    return 0 if response.ok else 1
+
+
+def import_command(args):
+    fmt = feed_format(args.file, args.format)
+    if args.url:
+        return upload(args, fmt)
+
+    from persistence import SharedRefreshQueue, SnapshotDatabase
+
+    path = os.environ.get('SNAPSHOT_DB', 'data/products.db')
+    if not path:
+        raise SystemExit('SNAPSHOT_DB is empty; set it, or pass --url to import through a running server')
+    with open_feed(args.file) as stream:
+        products, report = import_feed(stream, fmt, defaults_from(args), args.chunk_size)
+    result = {'success': bool(products), 'report': report.to_dict()}
+    if products:
+        catalogue = ImportedCatalogue(SnapshotDatabase(path))
+        started = time.perf_counter()
+        result['imported_total'] = catalogue.apply(products, args.mode)
+        result['save_seconds'] = round(time.perf_counter() - started, 3)
+        # serve.py's refresher publishes it; app.py picks the import up on its next refresh
+        result['job'] = SharedRefreshQueue(path).request_refresh(trigger='import')
+    print(json.dumps(result, indent=2))
+    return 0 if products else 1
+
+
+def export_command(args):
+    from persistence import SnapshotDatabase
+
+    path = os.environ.get('SNAPSHOT_DB', 'data/products.db')
+    stored = SnapshotDatabase(path).load() if path else None
+    if stored is None:
+        raise SystemExit(f"No snapshot stored in {path!r}")
+    version, _, products = stored
+    _, chunk_iter = export_feed(products, args.format)
+    if args.output == '-':
+        output = sys.stdout.buffer
+    else:
+        output = gzip.open(args.output, 'wb') if args.output.endswith('.gz') else open(args.output, 'wb')
+    with output:
+        for chunk in chunk_iter:
+            output.write(chunk)
+    logger.info(f"Exported {len(products)} products from snapshot v{version}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help='load a CSV or NDJSON feed into the imported catalogue')
+    importer.add_argument('file', help="feed file, optionally .gz, or '-' for stdin")
+    importer.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file name, else ndjson')
+    importer.add_argument('--mode', choices=IMPORT_MODES, default='merge',
+                          help='merge into the imported products or replace them (default merge)')
+    importer.add_argument('--source', help='source for rows without one')
+    importer.add_argument('--category', help='category for rows without one')
+    importer.add_argument('--currency', help='currency of prices written without one, e.g. USD')
+    importer.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    importer.add_argument('--url', help='send the feed to this running server instead of SNAPSHOT_DB')
+    importer.add_argument('--token', help='bearer token for --url (default: IMPORT_TOKEN)')
+
+    exporter = commands.add_parser('export', help='write the newest stored snapshot as CSV or NDJSON')
+    exporter.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson')
+    exporter.add_argument('--output', default='-', help="output file, gzipped when it ends in .gz (default stdout)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(import_command(args) if args.command == 'import' else export_command(args))
+
+
+if __name__ == '__main__':
+    main()
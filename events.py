@@ -0,0 +1,136 @@
+"""Server-Sent Events fan-out of snapshot changes to many idle clients on one event loop
+
+Every publish is turned into one pre-encoded frame, which is then queued for
+each connected client. A frame is one of:
+
+    snapshot  sent on connect: {version, total, timestamp}
+    diff      {version, previous_version, total, timestamp, added: [product], changed: [product], removed: [id]}
+    reset     {version, total, timestamp}: the change was too large to send, or
+              the client fell behind, so it should re-fetch /api/products
+
+Frame ids are snapshot versions. A client reconnecting with Last-Event-ID gets
+the diffs it missed replayed when they are still retained, and a reset otherwise.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+
+from response_cache import serialize_json
+
+logger = logging.getLogger(__name__)
+
+STREAM_MAX_DIFF = int(os.environ.get('STREAM_MAX_DIFF', 1000))
+STREAM_BACKLOG = int(os.environ.get('STREAM_BACKLOG', 32))
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 16))
+STREAM_KEEPALIVE = float(os.environ.get('STREAM_KEEPALIVE', 15))
+STREAM_RETRY_MS = 3000
+
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
+
+def format_event(event, payload, event_id=None):
+    """One SSE frame; compact JSON never contains a newline, so it fits on a single data line"""
+    head = f"id: {event_id}\nevent: {event}\n" if event_id is not None else f"event: {event}\n"
+    return head.encode('utf-8') + b'data: ' + serialize_json(payload).rstrip(b'\n') + b'\n\n'
+
+
+def _summary(snapshot):
+    return {
+        'version': snapshot.version,
+        'total': len(snapshot),
+        'timestamp': snapshot.last_updated.isoformat() if snapshot.last_updated else None
+    }
+
+
+class EventBroadcaster:
+    """Queue each published change for every connected stream client"""
+
+    def __init__(self, store, max_diff=STREAM_MAX_DIFF, backlog=STREAM_BACKLOG, queue_size=STREAM_QUEUE_SIZE):
+        self.store = store
+        self.max_diff = max_diff
+        self.queue_size = queue_size
+        self.loop = None
+        self.clients = set()
+        # (previous version, version, frame) of recent publishes, for Last-Event-ID replay
+        self.frames = deque(maxlen=backlog)
+        self.events = 0
+        self.resets = 0
+        self.overflows = 0
+
+    def start(self):
+        """Attach to the running event loop and start listening for publishes"""
+        if self.loop is None:
+            self.store.subscribe(self.on_publish)
+        self.loop = asyncio.get_running_loop()
+
+    def on_publish(self, snapshot):
+        """Snapshot listener; runs on the publishing thread, so the frame is built here and handed to the loop"""
+        diff = snapshot.diff
+        if diff is None or len(diff) > self.max_diff:
+            frame = format_event('reset', _summary(snapshot), snapshot.version)
+        else:
+            payload = _summary(snapshot)
+            payload.update({
+                'previous_version': snapshot.previous_version,
+                'added': diff.added,
+                'changed': [new for _, new in diff.changed],
+                'removed': [product.id for product in diff.removed]
+            })
+            frame = format_event('diff', payload, snapshot.version)
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._broadcast, snapshot.previous_version, snapshot.version, frame)
+
+    def _broadcast(self, previous_version, version, frame):
+        self.frames.append((previous_version, version, frame))
+        self.events += 1
+        for queue in self.clients:
+            self._offer(queue, frame)
+
+    def _offer(self, queue, frame):
+        """Queue a frame; a client that has fallen a whole queue behind is told to reset instead"""
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(format_event('reset', _summary(self.store.current), self.store.current.version))
+
+    def connect(self, last_event_id=None):
+        """Register a client and return its frame queue, primed with what it needs to catch up"""
+        queue = asyncio.Queue(self.queue_size)
+        current = self.store.current
+        for frame in self._catch_up(last_event_id, current):
+            self._offer(queue, frame)
+        self.clients.add(queue)
+        return queue
+
+    def _catch_up(self, last_event_id, current):
+        if last_event_id is None:
+            return [format_event('snapshot', _summary(current), current.version)]
+        try:
+            version = int(last_event_id)
+        except ValueError:
+            version = None
+        if version == current.version:
+            return []
+        missed = []
+        for previous_version, frame_version, frame in self.frames:
+            if missed or previous_version == version:
+                missed.append(frame)
+        if missed and len(missed) < self.queue_size:
+            return missed
+        self.resets += 1
+        return [format_event('reset', _summary(current), current.version)]
+
+    def disconnect(self, queue):
+        self.clients.discard(queue)
+
+    def stats(self):
+        return {
+            'clients': len(self.clients),
+            'events': self.events,
+            'resets': self.resets,
+            'overflows': self.overflows
+        }
@@ -0,0 +1,90 @@
+from aggregates import PRICE_BUCKETS, price_bucket
+
+FACETS = ('category', 'source', 'price_range')
+
+# Positions of the set bits in each byte value, for decoding bitmaps
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def to_bitmap(positions):
+    """Bitmap (a Python int, bit n for position n) of an iterable of positions"""
+    positions = list(positions)
+    if not positions:
+        return 0
+    bits = bytearray((max(positions) >> 3) + 1)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitmap_positions(bitmap):
+    """Positions of the set bits of a bitmap, in ascending order"""
+    positions = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            positions.extend(base + bit for bit in _BYTE_BITS[byte])
+    return positions
+
+
+def _facet_values(product):
+    return product.category, product.source, price_bucket(product.price_value)
+
+
+class FacetIndex:
+    """One bitmap per category, source and price bucket, built once per snapshot
+
+    Filters are ANDed as bitmaps. Facet counts are popcounts of the filtered
+    bitmap against each value's bitmap. Every facet is counted with the
+    filters on the other facets applied but not its own, so a selected
+    category still shows how many products the other categories would add.
+    """
+
+    def __init__(self, products):
+        self.size = len(products)
+        self.all = (1 << self.size) - 1
+        width = (self.size >> 3) + 1
+        builders = {facet: {} for facet in FACETS}
+        for pos, product in enumerate(products):
+            index, bit = pos >> 3, 1 << (pos & 7)
+            for facet, value in zip(FACETS, _facet_values(product)):
+                if value is None:
+                    continue
+                bits = builders[facet].get(value)
+                if bits is None:
+                    bits = builders[facet][value] = bytearray(width)
+                bits[index] |= bit
+        self.bitmaps = {
+            facet: {value: int.from_bytes(bits, 'little') for value, bits in values.items()}
+            for facet, values in builders.items()
+        }
+        # Every bucket is listed, as in /api/stats, even when no product falls in it
+        for name, _ in PRICE_BUCKETS:
+            self.bitmaps['price_range'].setdefault(name, 0)
+
+    def select(self, facet, values):
+        """Bitmap of the products having any of values for facet"""
+        bitmaps = self.bitmaps[facet]
+        selected = 0
+        for value in values:
+            selected |= bitmaps.get(value, 0)
+        return selected
+
+    def query(self, filters):
+        """AND the filter bitmaps (a facet name or any other label -> bitmap); return (matches, facet counts)"""
+        matches = self.all
+        for bitmap in filters.values():
+            matches &= bitmap
+
+        counts = {}
+        for facet in FACETS:
+            if facet in filters:
+                base = self.all
+                for name, bitmap in filters.items():
+                    if name != facet:
+                        base &= bitmap
+            else:
+                base = matches
+            counts[facet] = {value: (base & bitmap).bit_count() for value, bitmap in self.bitmaps[facet].items()}
+        return matches, counts
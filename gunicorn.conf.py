@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WORKER_THREADS', 4))
+
+# Load the app and the current snapshot once in the master so workers share those pages
+preload_app = True
+
+# Set to 0 when the refresher runs as a separate service (python serve.py refresher)
+embedded_refresher = os.environ.get('EMBEDDED_REFRESHER', '1') == '1'
+
+# Gunicorn re-reads this file on SIGHUP, so state that must outlive a reload lives in serve
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked: from now on the master loads each new
+    # snapshot and re-forks the workers, instead of every worker decoding its own copy
+    import serve
+    serve.start_master_reloads(server)
+    if embedded_refresher:
+        serve.start_refresher(server)
+
+
+def on_reload(server):
+    # SIGHUP from a worker that saw a newer snapshot. Gunicorn forks the new workers after this
+    # returns and then stops the old ones gracefully, so the new workers share what is loaded here
+    import serve
+    serve.reload_in_master(server)
+
+
+def on_exit(server):
+    import serve
+    serve.stop_refresher()
@@ -0,0 +1,85 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from product import Product
+
+PRICE_RE = re.compile(r'(AED|USD|INR|Rs\.?|₹|\$)\s*(\d[\d,]*(?:\.\d+)?)')
+
+CURRENCY_CODES = {
+    'AED': 'AED',
+    'USD': 'USD',
+    '$': 'USD',
+    'INR': 'INR',
+    'Rs': 'INR',
+    'Rs.': 'INR',
+    '₹': 'INR'
+}
+
+TRACKING_PARAMS = frozenset({
+    'ref', 'ref_', 'tag', 'srno', 'otracker', 'fm', 'iid', 'ppt', 'ppn', 'ssid',
+    'qid', 'sr', 'crid', 'sprefix', 'keywords'
+})
+
+
+def parse_price(text):
+    """Parse a display price such as "AED 1,59,900" into (amount, currency code)"""
+    match = PRICE_RE.search(text or '')
+    if not match:
+        return None, None
+    try:
+        amount = float(match.group(2).replace(',', ''))
+    except ValueError:
+        return None, None
+    return amount, CURRENCY_CODES[match.group(1)]
+
+
+def _normalize_text(text):
+    return ' '.join((text or '').lower().split())
+
+
+def _link_parts(link):
+    """(scheme, host, path, query, fragment) of the canonical form of a link"""
+    parts = urlsplit((link or '').strip())
+    query = parts.query and urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    ))
+    return parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), query, ''
+
+
+def normalize_link(link):
+    """Canonical product URL: lowercase host, no fragment, trailing slash or tracking parameters"""
+    return urlunsplit(_link_parts(link))
+
+
+def canonical_key(product):
+    """Identity of a product across refreshes: its source plus its link, or its title when the link is a bare site"""
+    parts = _link_parts(product.get('link'))
+    identity = urlunsplit(parts) if parts[2] or parts[3] else _normalize_text(product.get('title'))
+    return f"{_normalize_text(product.get('source'))}|{identity}"
+
+
+def stable_id(key):
+    """48-bit id hashed from a canonical key, so it survives refreshes and stays exact in JavaScript"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=6).digest(), 'big')
+
+
+def normalize_product(product):
+    """Turn a scraped product dict into a Product with a stable id and its price parsed into numeric columns"""
+    price_value, currency = parse_price(product.get('price'))
+    return Product.from_dict(dict(product, id=stable_id(canonical_key(product)),
+                                  price_value=price_value, currency=currency))
+
+
+def dedupe_products(products):
+    """Keep the first product seen for each id, in catalogue order"""
+    unique = {}
+    for product in products:
+        unique.setdefault(product.id, product)
+    return list(unique.values())
+
+
+def ingest_products(products):
+    """Normalize a batch of scraped products and drop the ones already seen on another page"""
+    return dedupe_products(normalize_product(product) for product in products)
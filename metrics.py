@@ -0,0 +1,130 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Seconds; spans a cached hit (well under a millisecond) to a slow scrape
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter; inc is a locked integer add"""
+
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram whose bucket counts are allocated once up front"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        """Cumulative bucket counts, sum and count at one instant"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class MetricsRegistry:
+    """Metric families rendered in the Prometheus text exposition format
+
+    Instruments on the request path are created up front, one child per label
+    value, so recording never allocates. Values that already live elsewhere
+    (cache stats, snapshot size) are read by collectors only when scraped.
+    """
+
+    def __init__(self):
+        self.families = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _register(self, name, kind, help, label, children):
+        with self.lock:
+            if name in self.families:
+                raise ValueError(f"Metric already registered: {name}")
+            self.families[name] = (kind, help, label, children)
+
+    def counter(self, name, help, label=None, values=()):
+        """A Counter, or a dict of Counters keyed by label value when label is given"""
+        children = OrderedDict((value, Counter()) for value in (values if label else (None,)))
+        self._register(name, 'counter', help, label, children)
+        return children if label else children[None]
+
+    def histogram(self, name, help, label=None, values=(), buckets=DEFAULT_BUCKETS):
+        """A Histogram, or a dict of Histograms keyed by label value when label is given"""
+        children = OrderedDict((value, Histogram(buckets)) for value in (values if label else (None,)))
+        self._register(name, 'histogram', help, label, children)
+        return children if label else children[None]
+
+    def collect(self, name, kind, help, fn, label=None):
+        """Report fn() at scrape time: a number, or a {label value: number} dict when label is given"""
+        self._register(name, kind, help, label, fn)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            families = list(self.families.items())
+        for name, (kind, help, label, children) in families:
+            if callable(children):
+                values = children()
+                if values is None:
+                    continue
+                samples = values.items() if label else [(None, values)]
+            else:
+                samples = children.items()
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for value, metric in samples:
+                pairs = [(label, value)] if label else []
+                if isinstance(metric, Histogram):
+                    cumulative, total, count = metric.snapshot()
+                    for bound, running in zip(metric.buckets + (float('inf'),), cumulative):
+                        lines.append(f"{name}_bucket{_labels(pairs + [('le', _number(bound))])} {running}")
+                    lines.append(f"{name}_sum{_labels(pairs)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(pairs)} {count}")
+                else:
+                    number = metric.value if isinstance(metric, Counter) else metric
+                    if number is not None:
+                        lines.append(f"{name}{_labels(pairs)} {_number(number)}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,98 @@
+import base64
+import csv
+import io
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+CSV_FIELDS = ('id', 'title', 'description', 'price', 'category', 'link', 'source', 'price_value', 'currency',
+              'scraped_at')
+
+
+def encode_cursor(version, position):
+    """Opaque cursor pointing at a position in a query result of one snapshot"""
+    raw = f"{version}:{position}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (version, position) for a cursor, raising ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        version, position = (int(part) for part in raw.split(':'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if version < 0 or position < 0:
+        raise ValueError('Invalid cursor')
+    return version, position
+
+
+def paginate(items, version, offset=None, page_size=None):
+    """Slice one page out of a query result and describe where the next page starts"""
+    offset = max(offset or 0, 0)
+    page_size = min(max(page_size or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    page = items[offset:offset + page_size]
+    next_offset = offset + len(page)
+    has_more = next_offset < len(items)
+    return page, {
+        'offset': offset,
+        'page_size': page_size,
+        'total': len(items),
+        'has_more': has_more,
+        'next_offset': next_offset if has_more else None,
+        'next_cursor': encode_cursor(version, next_offset) if has_more else None
+    }
+
+
+def _chunked(parts):
+    """Group small encoded parts into chunks of roughly STREAM_CHUNK_BYTES"""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_ndjson(products):
+    """Yield products as newline-delimited JSON without building the whole body"""
+    dumps = json.dumps
+    return _chunked((dumps(product.to_dict(), sort_keys=True) + '\n').encode('utf-8') for product in products)
+
+
+def iter_csv(products, fields=CSV_FIELDS):
+    """Yield products as CSV with a header row, in chunks of roughly STREAM_CHUNK_BYTES"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for product in products:
+        data = product.to_dict()
+        writer.writerow([data.get(field) for field in fields])
+        if buffer.tell() >= STREAM_CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_json_array(envelope, products, field='data'):
+    """Yield a JSON object whose products array is streamed item by item"""
+    dumps = json.dumps
+    head = dumps(envelope, sort_keys=True)[:-1]
+    head = (head + ',' if len(envelope) else head) + dumps(field) + ':['
+
+    def parts():
+        yield head.encode('utf-8')
+        for i, product in enumerate(products):
+            yield ((',' if i else '') + dumps(product.to_dict(), sort_keys=True)).encode('utf-8')
+        yield b']}\n'
+
+    return _chunked(parts())
@@ -0,0 +1,160 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html
+
+logger = logging.getLogger(__name__)
+
+
+def _has_class(name):
+    """XPath predicate matching one token of the class attribute, like BeautifulSoup's class_"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class SourceLayout:
+    """Where products, titles and prices live in a source's search result page"""
+
+    def __init__(self, source, base_url, item_xpath, title_xpath, price_xpath, item_strainer,
+                 title_tag, title_class, price_tag, price_class, title_text_xpath=None):
+        self.source = source
+        self.base_url = base_url
+        self.items = etree.XPath(item_xpath)
+        self.title = etree.XPath(title_xpath)
+        self.title_text = etree.XPath(title_text_xpath) if title_text_xpath else None
+        self.price = etree.XPath(price_xpath)
+        self.item_strainer = item_strainer
+        self.title_tag = title_tag
+        self.title_class = title_class
+        self.price_tag = price_tag
+        self.price_class = price_class
+
+
+LAYOUTS = {
+    'flipkart': SourceLayout(
+        source='Flipkart',
+        base_url='https://www.flipkart.com',
+        item_xpath='//div[@data-id]',
+        title_xpath=f".//a[{_has_class('IRpwTa')}]",
+        price_xpath=f".//div[{_has_class('_30jeq3')}]",
+        item_strainer=SoupStrainer('div', attrs={'data-id': True}),
+        title_tag='a', title_class='IRpwTa',
+        price_tag='div', price_class='_30jeq3'
+    ),
+    'amazon': SourceLayout(
+        source='Amazon',
+        base_url='https://www.amazon.in',
+        item_xpath="//div[@data-component-type='s-search-result']",
+        title_xpath=f".//h2//a[{_has_class('a-link-normal')}]",
+        title_text_xpath='.//span',
+        price_xpath=f".//span[{_has_class('a-price')}]/span[{_has_class('a-offscreen')}]",
+        item_strainer=SoupStrainer('div', attrs={'data-component-type': 's-search-result'}),
+        title_tag='h2', title_class=None,
+        price_tag='span', price_class='a-offscreen'
+    )
+}
+
+
+def _product(layout, category, title, href, price):
+    return {
+        'title': title.strip()[:50] + '...',
+        'description': f"Popular {category} from {layout.source}",
+        'price': price.strip(),
+        'category': category,
+        'link': layout.base_url + (href or ''),
+        'source': layout.source,
+        'scraped_at': datetime.now().isoformat()
+    }
+
+
+def parse_lxml(source_type, content, category, limit=5):
+    """Parse a result page with lxml and the source's precompiled XPath selectors"""
+    layout = LAYOUTS[source_type]
+    tree = html.fromstring(content)
+    products = []
+    for item in layout.items(tree)[:limit]:
+        titles = layout.title(item)
+        prices = layout.price(item)
+        if titles and prices:
+            title = titles[0]
+            text_nodes = layout.title_text(title) if layout.title_text else None
+            text = (text_nodes[0] if text_nodes else title).text_content()
+            products.append(_product(layout, category, text, title.get('href'), prices[0].text_content()))
+    return products
+
+
+def parse_soup(source_type, content, category, limit=5):
+    """Parse a result page with BeautifulSoup, building a tree only for the product containers"""
+    layout = LAYOUTS[source_type]
+    soup = BeautifulSoup(content, 'lxml', parse_only=layout.item_strainer)
+    products = []
+    for item in soup.find_all(layout.item_strainer.name, layout.item_strainer.attrs)[:limit]:
+        if layout.title_class:
+            title = item.find(layout.title_tag, class_=layout.title_class)
+        else:
+            heading = item.find(layout.title_tag)
+            title = heading.find('a') if heading else None
+        price = item.find(layout.price_tag, class_=layout.price_class)
+        if title and price:
+            products.append(_product(layout, category, title.text, title.get('href', ''), price.text))
+    return products
+
+
+PARSERS = {
+    'lxml': parse_lxml,
+    'soup': parse_soup
+}
+
+
+def parse_page(source_type, content, category, limit=5, parser='lxml'):
+    """Extract up to limit products from one page; unknown source types yield nothing"""
+    if source_type not in LAYOUTS:
+        return []
+    try:
+        return PARSERS[parser](source_type, content, category, limit)
+    except Exception as e:
+        logger.error(f"Failed to parse {source_type} page: {e}")
+        return []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(processes):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn keeps the workers free of the server's threads and open sockets
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool(pool):
+    """Drop a broken pool so the next batch starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_pages(pages, processes=0, parser='lxml'):
+    """Parse (source_type, content, category, limit) tuples, in a process pool when processes > 0
+
+    A pool whose worker died (for example OOM-killed) is discarded and the batch is parsed
+    in-process instead, so one lost worker does not fail every later refresh.
+    """
+    if processes and len(pages) > 1:
+        pool = _get_pool(processes)
+        try:
+            futures = [pool.submit(parse_page, *page, parser=parser) for page in pages]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            logger.warning('Parse pool broke, recreating it and parsing this batch in-process')
+            _reset_pool(pool)
+    return [parse_page(*page, parser=parser) for page in pages]
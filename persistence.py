@@ -0,0 +1,428 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from product import Product
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    version INTEGER PRIMARY KEY,
+    published_at TEXT NOT NULL,
+    product_count INTEGER NOT NULL
+)
+"""
+
+SNAPSHOT_CHUNKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot_chunks (
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (version, seq)
+)
+"""
+
+CHUNKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    digest TEXT PRIMARY KEY,
+    product_count INTEGER NOT NULL,
+    payload BLOB NOT NULL
+)
+"""
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refresh_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    trigger TEXT NOT NULL,
+    requested_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    version INTEGER,
+    error TEXT
+)
+"""
+
+IMPORTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    imported_at TEXT NOT NULL,
+    product_count INTEGER NOT NULL
+)
+"""
+
+IMPORT_CHUNKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_chunks (
+    seq INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL
+)
+"""
+
+SCRAPED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scraped (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    saved_at TEXT NOT NULL,
+    product_count INTEGER NOT NULL,
+    payload BLOB NOT NULL
+)
+"""
+
+JOB_COLUMNS = ('job_id', 'status', 'trigger', 'requested_at', 'started_at', 'finished_at', 'version', 'error')
+
+MAX_STORED_JOBS = 100
+
+# A chunk ends after a product whose id is a multiple of this, so on average it holds this
+# many products and an inserted or removed product only changes the chunk around it
+CHUNK_PRODUCTS = 1000
+MAX_CHUNK_PRODUCTS = 4 * CHUNK_PRODUCTS
+
+
+def _encode_products(products):
+    """Compact JSON array of products, encoded one product at a time rather than as one big list of dicts"""
+    dumps = json.dumps
+    return ('[' + ','.join(dumps(product.to_dict(), separators=(',', ':')) for product in products) + ']').encode('utf-8')
+
+
+def _decode_products(payload):
+    return [Product.from_dict(data) for data in json.loads(payload)]
+
+
+def _chunks(products):
+    """Split products into content-defined chunks, whose boundaries only depend on the ids around them"""
+    chunk = []
+    for product in products:
+        chunk.append(product)
+        if product.id % CHUNK_PRODUCTS == 0 or len(chunk) >= MAX_CHUNK_PRODUCTS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class SnapshotDatabase:
+    """Versioned copies of published snapshots kept in a local SQLite file
+
+    Snapshots and the imported catalogue are lists of chunks of products. A
+    chunk is stored once under the hash of its JSON and shared by every list
+    that holds it. The chunks last written or read are remembered with the
+    products they hold, so a save only encodes the chunks whose products
+    changed, and memory stays at one encoded chunk however large the catalogue.
+    """
+
+    def __init__(self, path, keep=5):
+        self.path = path
+        self.keep = keep
+        self.saved_version = 0
+        self.lock = threading.Lock()
+        # (product ids) -> (products, digest) of the chunks of the newest snapshot and of the imports
+        self.snapshot_chunks = {}
+        self.import_chunks = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction() as conn:
+            for schema in (SCHEMA, SNAPSHOT_CHUNKS_SCHEMA, CHUNKS_SCHEMA, IMPORTS_SCHEMA, IMPORT_CHUNKS_SCHEMA,
+                           SCRAPED_SCHEMA):
+                conn.execute(schema)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @contextmanager
+    def _transaction(self):
+        """Connection inside one write transaction, committed on success and rolled back on any error"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _store_chunks(self, conn, products, known):
+        """Digests of the chunks of products, writing the chunks not stored yet; return (digests, chunk cache)"""
+        digests = []
+        cache = {}
+        for chunk in _chunks(products):
+            ids = tuple(product.id for product in chunk)
+            cached = known.get(ids)
+            # The same product objects encode to the same chunk, if no other process has dropped it since
+            if (cached is not None and all(old is new for old, new in zip(cached[0], chunk))
+                    and conn.execute('SELECT 1 FROM chunks WHERE digest = ?', (cached[1],)).fetchone()):
+                digest = cached[1]
+            else:
+                payload = _encode_products(chunk)
+                digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+                conn.execute('INSERT OR IGNORE INTO chunks (digest, product_count, payload) VALUES (?, ?, ?)',
+                             (digest, len(chunk), payload))
+            digests.append(digest)
+            cache[ids] = (tuple(chunk), digest)
+        return digests, cache
+
+    @staticmethod
+    def _read_chunks(cursor):
+        """Decode (digest, payload) rows into (products, chunk cache), one chunk in memory at a time"""
+        products = []
+        cache = {}
+        for digest, payload in cursor:
+            chunk = _decode_products(payload)
+            products.extend(chunk)
+            cache[tuple(product.id for product in chunk)] = (tuple(chunk), digest)
+        return products, cache
+
+    @staticmethod
+    def _drop_unused_chunks(conn):
+        conn.execute('DELETE FROM snapshot_chunks WHERE version NOT IN (SELECT version FROM snapshots)')
+        conn.execute('DELETE FROM chunks WHERE digest NOT IN (SELECT digest FROM snapshot_chunks) '
+                     'AND digest NOT IN (SELECT digest FROM import_chunks)')
+
+    def _write_snapshot(self, conn, version, published_at, products):
+        digests, cache = self._store_chunks(conn, products, self.snapshot_chunks)
+        conn.execute('DELETE FROM snapshot_chunks WHERE version = ?', (version,))
+        conn.executemany('INSERT INTO snapshot_chunks (version, seq, digest) VALUES (?, ?, ?)',
+                         [(version, seq, digest) for seq, digest in enumerate(digests)])
+        conn.execute('INSERT OR REPLACE INTO snapshots (version, published_at, product_count) VALUES (?, ?, ?)',
+                     (version, published_at, len(products)))
+        return cache
+
+    def _write_imports(self, conn, version, imported_at, products):
+        digests, cache = self._store_chunks(conn, products, self.import_chunks)
+        conn.execute('DELETE FROM import_chunks')
+        conn.executemany('INSERT INTO import_chunks (seq, digest) VALUES (?, ?)', list(enumerate(digests)))
+        conn.execute('INSERT OR REPLACE INTO imports (id, version, imported_at, product_count) VALUES (1, ?, ?, ?)',
+                     (version, imported_at, len(products)))
+        return cache
+
+    def save(self, snapshot):
+        """Persist a snapshot, writing only its new chunks, and prune all but the newest `keep` versions"""
+        if snapshot.version <= self.saved_version:
+            return
+        published_at = (snapshot.last_updated or datetime.now()).isoformat()
+        with self.lock:
+            with self._transaction() as conn:
+                cache = self._write_snapshot(conn, snapshot.version, published_at, snapshot.products)
+                conn.execute(
+                    'DELETE FROM snapshots WHERE version NOT IN (SELECT version FROM snapshots ORDER BY version DESC LIMIT ?)',
+                    (self.keep,)
+                )
+                self._drop_unused_chunks(conn)
+            self.snapshot_chunks = cache
+            self.saved_version = snapshot.version
+        logger.info(f"Saved snapshot v{snapshot.version} to {self.path}")
+
+    def load(self, version=None):
+        """Return (version, published_at, products) for a stored snapshot, the newest by default"""
+        conn = self._connect()
+        try:
+            # Read the version row and its chunks from one consistent view of the file
+            conn.execute('BEGIN')
+            if version is None:
+                row = conn.execute('SELECT version, published_at FROM snapshots ORDER BY version DESC LIMIT 1').fetchone()
+            else:
+                row = conn.execute('SELECT version, published_at FROM snapshots WHERE version = ?', (version,)).fetchone()
+            if row is None:
+                return None
+            version, published_at = row
+            products, cache = self._read_chunks(conn.execute(
+                'SELECT chunks.digest, chunks.payload FROM snapshot_chunks JOIN chunks USING (digest) '
+                'WHERE snapshot_chunks.version = ? ORDER BY snapshot_chunks.seq', (version,)
+            ))
+        finally:
+            conn.close()
+        with self.lock:
+            if version > self.saved_version:
+                self.snapshot_chunks = cache
+            self.saved_version = max(self.saved_version, version)
+        return version, datetime.fromisoformat(published_at), products
+
+    def update_imports(self, update):
+        """Rewrite the stored imported catalogue in one write transaction; return (new version, products)
+
+        update(stored version, load) returns the new product list, where load() decodes
+        the stored products. Holding the write lock from the read to the write means
+        imports from several processes are applied one after the other, never lost.
+        Only chunks holding new or changed products are encoded and written.
+        """
+        with self.lock:
+            with self._transaction() as conn:
+                row = conn.execute('SELECT version FROM imports WHERE id = 1').fetchone()
+                stored_version = row[0] if row else 0
+
+                def load():
+                    return self._read_chunks(conn.execute(
+                        'SELECT chunks.digest, chunks.payload FROM import_chunks JOIN chunks USING (digest) '
+                        'ORDER BY import_chunks.seq'
+                    ))[0]
+
+                products = update(stored_version, load)
+                version = stored_version + 1
+                cache = self._write_imports(conn, version, datetime.now().isoformat(), products)
+                self._drop_unused_chunks(conn)
+            self.import_chunks = cache
+        logger.info(f"Saved {len(products)} imported products as import v{version} to {self.path}")
+        return version, products
+
+    def imports_version(self):
+        with self._connect() as conn:
+            row = conn.execute('SELECT version FROM imports WHERE id = 1').fetchone()
+        return row[0] if row else 0
+
+    def load_imports(self):
+        """Return (version, products) for the stored imported catalogue, or None when nothing was imported"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            row = conn.execute('SELECT version FROM imports WHERE id = 1').fetchone()
+            if row is None:
+                return None
+            products, cache = self._read_chunks(conn.execute(
+                'SELECT chunks.digest, chunks.payload FROM import_chunks JOIN chunks USING (digest) '
+                'ORDER BY import_chunks.seq'
+            ))
+        finally:
+            conn.close()
+        with self.lock:
+            self.import_chunks = cache
+        return row[0], products
+
+    def save_scraped(self, products):
+        """Store the scraped products of the latest merge, so a restart can tell them apart from imports"""
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO scraped (id, saved_at, product_count, payload) VALUES (1, ?, ?, ?)',
+                (datetime.now().isoformat(), len(products), _encode_products(products))
+            )
+
+    def load_scraped(self):
+        """The scraped products stored by save_scraped, or None when none were stored"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT payload FROM scraped WHERE id = 1').fetchone()
+        return _decode_products(row[0]) if row else None
+
+
+class SharedVersion:
+    """Memory-mapped 8-byte counter holding the newest snapshot version, shared by every process"""
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            self.map = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    def read(self):
+        return struct.unpack_from('<Q', self.map, 0)[0]
+
+    def write(self, version):
+        struct.pack_into('<Q', self.map, 0, version)
+
+
+class SharedRefreshQueue:
+    """Refresh jobs kept in SQLite so any worker can enqueue them and one refresher process runs them"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(JOBS_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _row_to_job(self, row):
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def _insert(self, conn, trigger, status='queued'):
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': status,
+            'trigger': trigger,
+            'requested_at': datetime.now().isoformat(),
+            'started_at': datetime.now().isoformat() if status == 'running' else None,
+            'finished_at': None,
+            'version': None,
+            'error': None
+        }
+        conn.execute(f"INSERT INTO refresh_jobs ({', '.join(JOB_COLUMNS)}) VALUES ({', '.join('?' * len(JOB_COLUMNS))})",
+                     [job[column] for column in JOB_COLUMNS])
+        conn.execute(
+            'DELETE FROM refresh_jobs WHERE job_id NOT IN '
+            '(SELECT job_id FROM refresh_jobs ORDER BY requested_at DESC LIMIT ?)',
+            (MAX_STORED_JOBS,)
+        )
+        return job
+
+    def request_refresh(self, trigger='manual'):
+        """Enqueue a refresh and return its job, reusing the queued or running job if there is one
+
+        An import only reuses a queued job: a running one may have read the imports before they changed.
+        """
+        statuses = "('queued', 'running')" if trigger == 'manual' else "('queued')"
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM refresh_jobs WHERE status IN {statuses} "
+                'ORDER BY requested_at LIMIT 1'
+            ).fetchone()
+            job = self._row_to_job(row) or self._insert(conn, trigger)
+            conn.execute('COMMIT')
+            return job
+        finally:
+            conn.close()
+
+    def get_job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM refresh_jobs WHERE job_id = ?",
+                               (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def claim(self, trigger=None):
+        """Mark the oldest queued job as running and return it, creating one for trigger if none is queued"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM refresh_jobs WHERE status = 'queued' "
+                'ORDER BY requested_at LIMIT 1'
+            ).fetchone()
+            job = self._row_to_job(row)
+            if job:
+                job['status'] = 'running'
+                job['started_at'] = datetime.now().isoformat()
+                conn.execute('UPDATE refresh_jobs SET status = ?, started_at = ? WHERE job_id = ?',
+                             (job['status'], job['started_at'], job['job_id']))
+            elif trigger:
+                job = self._insert(conn, trigger, status='running')
+            conn.execute('COMMIT')
+            return job
+        finally:
+            conn.close()
+
+    def abandon_running(self):
+        """Fail jobs left running by a refresher process that has gone away"""
+        with self._connect() as conn:
+            conn.execute("UPDATE refresh_jobs SET status = 'failed', finished_at = ?, error = ? WHERE status = 'running'",
+                         (datetime.now().isoformat(), 'Refresher restarted before the job finished'))
+
+    def finish(self, job_id, status, version=None, error=None):
+        with self._connect() as conn:
+            conn.execute('UPDATE refresh_jobs SET status = ?, finished_at = ?, version = ?, error = ? WHERE job_id = ?',
+                         (status, datetime.now().isoformat(), version, error, job_id))
@@ -0,0 +1,25 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class PriceIndex:
+    """Product positions sorted by numeric price, for range queries and price ordering"""
+
+    def __init__(self, products):
+        self.column = [product.price_value for product in products]
+        priced = sorted((value, pos) for pos, value in enumerate(self.column) if value is not None)
+        self.values = array('d', (value for value, _ in priced))
+        self.positions = array('l', (pos for _, pos in priced))
+        self.unpriced = [pos for pos, value in enumerate(self.column) if value is None]
+
+    def range(self, min_price=None, max_price=None):
+        """Positions priced within [min_price, max_price], cheapest first"""
+        lo = 0 if min_price is None else bisect_left(self.values, min_price)
+        hi = len(self.values) if max_price is None else bisect_right(self.values, max_price)
+        return self.positions[lo:hi]
+
+    def in_range(self, pos, min_price=None, max_price=None):
+        value = self.column[pos]
+        if value is None:
+            return False
+        return (min_price is None or value >= min_price) and (max_price is None or value <= max_price)
@@ -0,0 +1,81 @@
+import sys
+from datetime import datetime
+
+FIELDS = ('id', 'title', 'description', 'price', 'category', 'link', 'source',
+          'scraped_at', 'price_value', 'currency')
+
+
+def _timestamp(value):
+    """Seconds since the epoch for an ISO string or number"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Product:
+    """Compact product record; category, source and currency strings are interned"""
+
+    __slots__ = FIELDS
+
+    def __init__(self, id, title, description, price, category, link, source,
+                 scraped_at=None, price_value=None, currency=None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.price = price
+        self.category = _intern(category)
+        self.link = link
+        self.source = _intern(source)
+        self.scraped_at = _timestamp(scraped_at)
+        self.price_value = price_value
+        self.currency = _intern(currency)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a product from the API/JSON dict shape, ignoring unknown keys"""
+        return cls(**{field: data[field] for field in FIELDS if field in data})
+
+    def to_dict(self):
+        """The product in the API's JSON shape"""
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'price': self.price,
+            'category': self.category,
+            'link': self.link,
+            'source': self.source,
+            'price_value': self.price_value,
+            'currency': self.currency
+        }
+        # Fallback entries were never scraped and keep their original shape without it
+        if self.scraped_at is not None:
+            data['scraped_at'] = datetime.fromtimestamp(self.scraped_at).isoformat()
+        return data
+
+    def replace(self, **changes):
+        """Copy of the product with some fields changed"""
+        values = {field: getattr(self, field) for field in FIELDS}
+        values.update(changes)
+        return Product(**values)
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Product(id={self.id!r}, title={self.title!r})"
+
+
+def json_default(obj):
+    """json.dumps hook that writes products in their API shape"""
+    if isinstance(obj, Product):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
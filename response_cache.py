@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from product import json_default
+
+GZIP_MIN_BYTES = 1024
+
+
+def serialize_json(payload):
+    """Encode a payload the same way jsonify does outside debug mode"""
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':'), default=json_default) + '\n').encode('utf-8')
+
+
+def make_etag(key, published_at=None):
+    """Strong ETag for a cache key; the key always starts with the snapshot version
+
+    Versions restart at 1 when a process starts without a stored snapshot, so the
+    snapshot's publish time goes into the tag too: a tag from before a restart
+    never matches different content published after it.
+    """
+    published = published_at.timestamp() if published_at else None
+    digest = hashlib.blake2b(repr((published,) + tuple(key)).encode('utf-8'), digest_size=10).hexdigest()
+    return f"v{key[0]}-{digest}"
+
+
+def gzip_etag(etag):
+    """ETag of the gzipped representation; it differs from the identity body byte for byte, so its tag does too"""
+    return f"{etag}-gz"
+
+
+class CachedResponse:
+    """Pre-serialized response body, optionally with a pre-gzipped copy"""
+
+    __slots__ = ('body', 'gzipped')
+
+    def __init__(self, body, compress=True):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6) if compress and len(body) >= GZIP_MIN_BYTES else None
+
+    @property
+    def size(self):
+        return len(self.body) + (len(self.gzipped) if self.gzipped else 0)
+
+
+class ResponseCache:
+    """LRU cache of serialized responses bounded by a total byte budget"""
+
+    def __init__(self, max_bytes, compress=True):
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, payload):
+        """Serialize a payload, store it and return the cached entry"""
+        entry = CachedResponse(serialize_json(payload), self.compress)
+        if entry.size > self.max_bytes:
+            return entry
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.size
+            self.entries[key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
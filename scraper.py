@@ -0,0 +1,124 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to rate limit requests to one host"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ScrapeEngine:
+    """Fetch sources concurrently over pooled keep-alive sessions with per-host rate limits"""
+
+    def __init__(self, max_workers=8, rate=0.5, burst=1, timeout=10, retries=2, backoff=0.5):
+        self.max_workers = max_workers
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.sessions = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scraper')
+
+    def _host_state(self, url):
+        """Return the shared session and rate limiter for the host of a URL"""
+        host = urlparse(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return session, self.buckets[host]
+
+    def fetch(self, url, timeout=None, retries=None, headers=None):
+        """Fetch a URL with rate limiting, retries and exponential backoff; a 304 is returned as is"""
+        session, bucket = self._host_state(url)
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            try:
+                response = session.get(url, timeout=timeout, headers=headers)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.RequestException as e:
+                if isinstance(e, requests.exceptions.HTTPError):
+                    logger.error(f"Request failed for {url}: {e}")
+                    return None
+                error = e
+
+            if attempt < retries:
+                delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+                logger.warning(f"Retrying {url} in {delay:.2f}s after: {error}")
+                time.sleep(delay)
+
+        logger.error(f"Request failed for {url}: {error}")
+        return None
+
+    def _timed_fetch(self, source):
+        started = time.perf_counter()
+        try:
+            return self.fetch(source['url'], source.get('timeout'), source.get('retries'), source.get('headers'))
+        finally:
+            source['elapsed'] = time.perf_counter() - started
+
+    def fetch_all(self, sources):
+        """Fetch every source concurrently and return (source, response) pairs in input order
+
+        Each source dict also gets the seconds its fetch took, retries included, under 'elapsed'.
+        """
+        futures = [self.executor.submit(self._timed_fetch, source) for source in sources]
+        return [(source, future.result()) for source, future in zip(sources, futures)]
+
+    def close(self):
+        """Shut down the worker pool and close all pooled connections"""
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+            self.buckets.clear()
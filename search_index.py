@@ -0,0 +1,325 @@
+import re
+from collections import Counter
+from itertools import compress, repeat
+from operator import contains
+
+TOKEN_RE = re.compile(r'\w+')
+
+SEARCH_FIELDS = ('title', 'description', 'category')
+
+# A title hit outranks a category or description hit, even both together
+FIELD_WEIGHTS = {'title': 4, 'category': 2, 'description': 1}
+
+MAX_GRAM = 3
+
+FUZZY_GRAM = 3
+
+# A query whose postings add up to more than this many entries per candidate
+# product is answered by scanning the normalized text instead of the postings
+SCAN_POSTINGS_RATIO = 1
+
+# translate() tables turning a byte of scores into 1 where it equals the score and 0 elsewhere
+_SCORE_MASKS = [bytes(int(value == score) for value in range(256)) for score in range(256)]
+
+
+def term_grams(term):
+    """Every substring of a term up to MAX_GRAM characters long"""
+    return {term[i:i + n] for n in range(1, MAX_GRAM + 1) for i in range(len(term) - n + 1)}
+
+
+def fuzzy_grams(term):
+    """Trigrams of a term padded with a space at both ends, so its first and last letters count too"""
+    padded = f" {term} "
+    return {padded[i:i + FUZZY_GRAM] for i in range(len(padded) - FUZZY_GRAM + 1)}
+
+
+def max_edits(term):
+    """Typos tolerated in a query term: none up to 2 letters, one up to 5, two beyond"""
+    if len(term) <= 2:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def bounded_distance(a, b, limit):
+    """Edit distance counting an adjacent swap as one edit, or limit + 1 as soon as it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    before = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        char = a[i - 1]
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != b[j - 1]))
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class SearchIndex:
+    """Inverted index over the searchable product fields, built once per snapshot"""
+
+    def __init__(self, products):
+        self.size = len(products)
+        self.normalized = {field: [] for field in SEARCH_FIELDS}
+        self.postings = {field: {} for field in SEARCH_FIELDS}
+        self.categories = {}
+
+        for pos, product in enumerate(products):
+            for field in SEARCH_FIELDS:
+                text = (getattr(product, field) or '').lower()
+                self.normalized[field].append(text)
+                field_postings = self.postings[field]
+                for term in set(TOKEN_RE.findall(text)):
+                    field_postings.setdefault(term, []).append(pos)
+            self.categories.setdefault(product.category, []).append(pos)
+
+        self.category_sets = {category: frozenset(positions) for category, positions in self.categories.items()}
+        self.category_values = set(self.normalized['category'])
+
+        vocabulary = {term for field_postings in self.postings.values() for term in field_postings}
+        self.grams = {}
+        # padded trigram -> term length -> terms, so typo candidates are only counted in lengths they can match
+        self.fuzzy_grams = {}
+        self.fuzzy_gram_counts = {}
+        # term length -> terms, for the short terms a typo can leave with no trigram in common
+        self.terms_by_length = {}
+        for term in vocabulary:
+            for gram in term_grams(term):
+                self.grams.setdefault(gram, set()).add(term)
+            grams = fuzzy_grams(term)
+            self.fuzzy_gram_counts[term] = len(grams)
+            self.terms_by_length.setdefault(len(term), []).append(term)
+            for gram in grams:
+                self.fuzzy_grams.setdefault(gram, {}).setdefault(len(term), []).append(term)
+
+    def terms_containing(self, fragment):
+        """Vocabulary terms that contain fragment as a substring"""
+        if len(fragment) <= MAX_GRAM:
+            return self.grams.get(fragment, set())
+        candidates = None
+        for gram in sorted((fragment[i:i + MAX_GRAM] for i in range(len(fragment) - MAX_GRAM + 1)),
+                           key=lambda g: len(self.grams.get(g, ()))):
+            terms = self.grams.get(gram)
+            if not terms:
+                return set()
+            candidates = set(terms) if candidates is None else candidates & terms
+            if not candidates:
+                return candidates
+        return {term for term in candidates if fragment in term}
+
+    def similar_terms(self, fragment):
+        """Vocabulary terms matching fragment despite typos, each with a similarity of 1 / (1 + edits)
+
+        Terms containing the fragment match with similarity 1, as in exact search.
+        Other candidates must be within max_edits letters of the fragment's length
+        and share enough distinct padded trigrams with it to possibly be within
+        max_edits of it, and are then verified by edit distance. When the fragment
+        and a term are both short enough for that bound to be zero, the term is
+        verified even if it shares no trigram at all ('jnl' still finds 'jbl').
+        """
+        matches = dict.fromkeys(self.terms_containing(fragment), 1.0)
+        limit = max_edits(fragment)
+        if not limit:
+            return matches
+        grams = fuzzy_grams(fragment)
+        length = len(fragment)
+        lengths = range(length - limit, length + limit + 1)
+        shared = Counter()
+        for gram in grams:
+            by_length = self.fuzzy_grams.get(gram)
+            if by_length:
+                for size in lengths:
+                    terms = by_length.get(size)
+                    if terms:
+                        shared.update(terms)
+        # An edit destroys at most FUZZY_GRAM + 1 trigrams of either string (a swap touches two
+        # letters), so a match keeps all but that many of the distinct trigrams of both
+        destroyed = (FUZZY_GRAM + 1) * limit
+        needed = len(grams) - destroyed
+        counts = self.fuzzy_gram_counts
+        candidates = list(shared.items())
+        if needed <= 0:
+            # Terms with at most `destroyed` trigrams may share none; only short lengths can have so few
+            for size in lengths:
+                if size <= destroyed:
+                    candidates.extend((term, 0) for term in self.terms_by_length.get(size, ()) if term not in shared)
+        for term, count in candidates:
+            if count < needed or count < counts[term] - destroyed or term in matches:
+                continue
+            distance = bounded_distance(fragment, term, limit)
+            if distance <= limit:
+                matches[term] = 1 / (1 + distance)
+        return matches
+
+    def _allowed(self, category):
+        """Positions in category, None for every category, or an empty set for an unknown one"""
+        if category and category != 'all':
+            return self.category_sets.get(category, frozenset())
+        return None
+
+    def _field_hits(self, fragment, terms=None):
+        """Positions whose field holds a term containing fragment, per field"""
+        if terms is None:
+            terms = self.terms_containing(fragment)
+        hits = {}
+        for field in SEARCH_FIELDS:
+            field_postings = self.postings[field]
+            hits[field] = set().union(*[field_postings[term] for term in terms if term in field_postings])
+        return hits
+
+    def _postings_size(self, terms):
+        return sum(len(field_postings[term]) for field_postings in self.postings.values()
+                   for term in terms if term in field_postings)
+
+    @staticmethod
+    def _rank_hits(hits):
+        """Positions hit in any field, by summed field weight and then position
+
+        Hits are split into one set per score with set operations and each set is
+        sorted on its own, so no position is scored one at a time. When a single
+        field has hits they all weigh the same and are only sorted.
+        """
+        hits = [(FIELD_WEIGHTS[field], positions) for field, positions in hits.items() if positions]
+        if not hits:
+            return []
+        if len(hits) == 1:
+            return sorted(hits[0][1])
+        groups = {0: set().union(*(positions for _, positions in hits))}
+        for weight, positions in hits:
+            split = {}
+            for score, group in groups.items():
+                inside = group & positions
+                outside = group - inside if inside else group
+                for score, part in ((score + weight, inside), (score, outside)):
+                    if part:
+                        split[score] = split[score] | part if score in split else part
+            groups = split
+        ranked = []
+        for score in sorted(groups, reverse=True):
+            ranked.extend(sorted(groups[score]))
+        return ranked
+
+    def _scan(self, query, positions=None):
+        """Positions (all, or the ascending positions given) whose fields contain query, ranked as _rank_hits does
+
+        Each field is matched with a C-level map into one byte per position, and the
+        weighted bytes are summed as big integers, so no Python code runs per position.
+        """
+        count = self.size if positions is None else len(positions)
+        if not count:
+            return []
+        total = 0
+        for field in SEARCH_FIELDS:
+            texts = self.normalized[field]
+            if positions is not None:
+                texts = map(texts.__getitem__, positions)
+            if field == 'category':
+                # Few distinct categories: match each once and look the rest up
+                matched = {value: query in value for value in self.category_values}
+                found = map(matched.__getitem__, texts)
+            else:
+                found = map(contains, texts, repeat(query))
+            total += FIELD_WEIGHTS[field] * int.from_bytes(bytes(found), 'little')
+        scores = total.to_bytes(count, 'little')
+        candidates = range(self.size) if positions is None else positions
+        ranked = []
+        for score in sorted(set(scores), reverse=True):
+            if score:
+                ranked.extend(compress(candidates, scores.translate(_SCORE_MASKS[score])))
+        return ranked
+
+    def search(self, query=None, category=None):
+        """Return matching positions, ranked by relevance when a query is given"""
+        if category and category != 'all':
+            allowed = self.category_sets.get(category)
+            if allowed is None:
+                return []
+        else:
+            allowed = None
+
+        if not query:
+            if allowed is None:
+                return list(range(self.size))
+            return list(self.categories[category])
+
+        query = query.lower()
+        fragments = TOKEN_RE.findall(query)
+
+        if fragments == [query]:
+            terms = self.terms_containing(query)
+            if not terms:
+                return []
+            if self._postings_size(terms) > SCAN_POSTINGS_RATIO * (self.size if allowed is None else len(allowed)):
+                # Short fragments like "a" hit most products: one pass over the text beats the postings
+                return self._scan(query, None if allowed is None else self.categories[category])
+            hits = self._field_hits(query, terms)
+            if allowed is not None:
+                hits = {field: positions & allowed for field, positions in hits.items()}
+            return self._rank_hits(hits)
+
+        if fragments:
+            candidates = None
+            for fragment in sorted(set(fragments), key=len, reverse=True):
+                positions = set().union(*self._field_hits(fragment).values())
+                candidates = positions if candidates is None else candidates & positions
+                if not candidates:
+                    return []
+            if allowed is not None:
+                candidates &= allowed
+            return self._scan(query, sorted(candidates))
+        return self._scan(query, None if allowed is None else self.categories[category])
+
+    def fuzzy_search(self, query, category=None):
+        """Typo-tolerant search: every query term must be within a few edits of a term in the product
+
+        A term scores its field weight times the best similarity in each field,
+        summed over fields and then over query terms.
+        """
+        fragments = TOKEN_RE.findall((query or '').lower())
+        if not fragments:
+            return self.search(query, category)
+        allowed = self._allowed(category)
+        if allowed is not None and not allowed:
+            return []
+
+        scores = None
+        for fragment in sorted(set(fragments), key=len, reverse=True):
+            # Ascending similarity, so the best match of each position is written last
+            terms = sorted(self.similar_terms(fragment).items(), key=lambda item: item[1])
+            field_scores = []
+            for field in SEARCH_FIELDS:
+                weight = FIELD_WEIGHTS[field]
+                field_postings = self.postings[field]
+                best = {}
+                for term, similarity in terms:
+                    positions = field_postings.get(term)
+                    if positions:
+                        best.update(dict.fromkeys(positions, weight * similarity))
+                field_scores.append(best)
+            # Add the smaller fields into the largest one rather than copying it
+            field_scores.sort(key=len)
+            fragment_scores = field_scores.pop()
+            for best in field_scores:
+                for pos, points in best.items():
+                    fragment_scores[pos] = fragment_scores.get(pos, 0) + points
+
+            if scores is None:
+                scores = fragment_scores if allowed is None else {
+                    pos: score for pos, score in fragment_scores.items() if pos in allowed}
+            elif len(fragment_scores) < len(scores):
+                scores = {pos: score + scores[pos] for pos, score in fragment_scores.items() if pos in scores}
+            else:
+                scores = {pos: score + fragment_scores[pos] for pos, score in scores.items() if pos in fragment_scores}
+            if not scores:
+                return []
+
+        ranked = sorted(scores)
+        ranked.sort(key=scores.__getitem__, reverse=True)
+        return ranked
@@ -0,0 +1,169 @@
+"""Production serving mode: pre-forked workers serving the snapshots a refresher process writes
+
+Workers never scrape. A single refresher process scrapes on schedule and on
+request, saves each snapshot to SNAPSHOT_DB and bumps a memory-mapped version
+counter. Under gunicorn.conf.py the first worker to see that counter move
+sends the master SIGHUP. The master decodes and indexes the new snapshot once
+in gunicorn's on_reload hook, then gunicorn forks fresh workers and gracefully
+stops the old ones. The new workers share the catalogue and its indexes
+copy-on-write, so memory per worker stays flat as the catalogue changes.
+
+The master loads snapshots only from its own main loop, between forks, and
+never starts a thread, so a fork can never copy a held lock or a half-used
+connection into a worker. Under any other server, workers load newer
+snapshots themselves, off the request threads.
+
+    gunicorn -c gunicorn.conf.py serve:app
+    python serve.py refresher      # run the refresher as its own service instead
+"""
+import fcntl
+import gc
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import app as backend
+from persistence import SharedRefreshQueue, SharedVersion
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0
+
+app = backend.app
+
+if not backend.snapshot_db:
+    raise RuntimeError('serve.py needs SNAPSHOT_DB to point at a shared SQLite file')
+
+shared_version = SharedVersion(backend.SNAPSHOT_DB + '.version')
+# Newest version a worker has asked the gunicorn master to reload, so it is asked once per version
+requested_version = SharedVersion(backend.SNAPSHOT_DB + '.reload')
+refresh_queue = SharedRefreshQueue(backend.SNAPSHOT_DB)
+load_lock = threading.Lock()
+
+# Set in the gunicorn master before it forks, when it loads snapshots itself and re-forks workers
+master_reloads = False
+refresher_process = None
+
+
+def load_shared_snapshot():
+    """Publish the newest stored snapshot in this process"""
+    try:
+        stored = backend.snapshot_db.load()
+        if stored is not None:
+            version, published_at, products = stored
+            if version > backend.snapshot_store.current.version:
+                backend.snapshot_store.publish(products, last_updated=published_at, version=version)
+    except Exception as e:
+        logger.error(f"Failed to load shared snapshot: {e}")
+    finally:
+        load_lock.release()
+
+
+def request_master_reload(version):
+    """Send the gunicorn master SIGHUP, unless a worker already asked it to load this version"""
+    with open(requested_version.path, 'rb') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if requested_version.read() >= version:
+            return
+        requested_version.write(version)
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+@app.before_request
+def sync_snapshot():
+    """Cheap version check; a newer snapshot is loaded by the master, or off the request thread"""
+    version = shared_version.read()
+    if version <= backend.snapshot_store.current.version:
+        return
+    if master_reloads:
+        if requested_version.read() < version:
+            request_master_reload(version)
+    elif load_lock.acquire(blocking=False):
+        threading.Thread(target=load_shared_snapshot, name='snapshot-loader', daemon=True).start()
+
+
+def preload():
+    """Load the shared snapshot in the master before forking so workers start with it"""
+    backend.refresher = refresh_queue
+    if load_lock.acquire(blocking=False):
+        load_shared_snapshot()
+    gc.freeze()
+
+
+def reload_in_master(server):
+    """Gunicorn master, before it forks: load the newest snapshot here so the next workers share it"""
+    if shared_version.read() > backend.snapshot_store.current.version and load_lock.acquire(blocking=False):
+        load_shared_snapshot()
+        gc.freeze()
+        server.log.info(f"Master loaded snapshot v{backend.snapshot_store.current.version}")
+
+
+def start_master_reloads(server):
+    """Gunicorn master, before the first fork: from now on workers ask the master to load snapshots"""
+    global master_reloads
+    master_reloads = True
+    reload_in_master(server)
+    # Forget requests from an earlier master; a version this one failed to load is asked for once more
+    requested_version.write(backend.snapshot_store.current.version)
+
+
+def start_refresher(server):
+    """Run the refresher as a child of the gunicorn master"""
+    global refresher_process
+    refresher_process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'refresher'])
+    server.log.info(f"Started refresher process {refresher_process.pid}")
+
+
+def stop_refresher():
+    if refresher_process is not None and refresher_process.poll() is None:
+        refresher_process.terminate()
+        refresher_process.wait(5)
+
+
+def run_refresher():
+    """Scrape on schedule and on request, publishing every snapshot to the shared store"""
+    backend.snapshot_store.subscribe(lambda snapshot: shared_version.write(snapshot.version))
+    refresh_queue.abandon_running()
+
+    interval = backend.REFRESH_INTERVAL or None
+    if not backend.snapshot_store.current.version and load_lock.acquire(blocking=False):
+        load_shared_snapshot()
+
+    current = backend.snapshot_store.current.version
+    if current:
+        shared_version.write(current)
+        next_run = time.monotonic() + interval if interval else None
+    else:
+        next_run = time.monotonic()
+
+    logger.info('Refresher process started')
+    while True:
+        due = next_run is not None and time.monotonic() >= next_run
+        job = refresh_queue.claim(trigger='scheduled' if due else None)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        try:
+            products = backend.scrape_tech_products(force=job['trigger'] == 'manual')
+            snapshot = backend.snapshot_store.current if products is None else backend.snapshot_store.publish(products)
+            refresh_queue.finish(job['job_id'], 'done', version=snapshot.version)
+        except Exception as e:
+            logger.error(f"Refresh job {job['job_id']} failed: {e}")
+            refresh_queue.finish(job['job_id'], 'failed', error=str(e))
+        if interval:
+            next_run = time.monotonic() + interval
+
+
+preload()
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['refresher']:
+        run_refresher()
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,240 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from aggregates import Aggregates
+from facets import FacetIndex
+from price_index import PriceIndex
+from product import FIELDS
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_JOBS = 100
+
+RETAINED_SNAPSHOTS = 4
+
+# A re-scrape always moves scraped_at, so it does not count as a change
+DIFF_FIELDS = tuple(field for field in FIELDS if field not in ('id', 'scraped_at'))
+
+
+def _content(product):
+    return tuple(getattr(product, field) for field in DIFF_FIELDS)
+
+
+class SnapshotDiff:
+    """Products added, changed and removed between two snapshots, matched by id"""
+
+    def __init__(self, added=(), changed=(), removed=()):
+        self.added = list(added)
+        self.changed = list(changed)
+        self.removed = list(removed)
+
+    @classmethod
+    def between(cls, old, new):
+        """Diff two id -> product maps; changed holds (old, new) pairs"""
+        added, changed = [], []
+        for product_id, product in new.items():
+            previous = old.get(product_id)
+            if previous is None:
+                added.append(product)
+            elif previous is not product and _content(previous) != _content(product):
+                changed.append((previous, product))
+        removed = [product for product_id, product in old.items() if product_id not in new]
+        return cls(added, changed, removed)
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def apply_to(self, aggregates):
+        """Aggregates of the new snapshot derived from the old one's"""
+        return aggregates.apply(
+            added=self.added + [new for _, new in self.changed],
+            removed=self.removed + [old for old, _ in self.changed]
+        )
+
+    def to_dict(self):
+        return {
+            'added': [product.id for product in self.added],
+            'changed': [new.id for _, new in self.changed],
+            'removed': [product.id for product in self.removed]
+        }
+
+
+class Snapshot:
+    """Immutable view of the product catalogue, built once and never mutated after publishing"""
+
+    def __init__(self, products, version=0, last_updated=None, aggregates=None, previous=None):
+        self.products = tuple(products)
+        self.version = version
+        self.last_updated = last_updated
+        self.by_id = {}
+        for product in self.products:
+            self.by_id.setdefault(product.id, product)
+        self.previous_version = previous.version if previous is not None else None
+        self.diff = SnapshotDiff.between(previous.by_id, self.by_id) if previous is not None else None
+        if aggregates is None:
+            aggregates = self._derive_aggregates(previous)
+        self.aggregates = aggregates
+        self.search_index = SearchIndex(self.products)
+        self.price_index = PriceIndex(self.products)
+        self.facet_index = FacetIndex(self.products)
+
+    def _derive_aggregates(self, previous):
+        """Patch the previous snapshot's counts when few products changed, otherwise count from scratch"""
+        if (self.diff is None or len(self.diff) * 2 >= len(self.products)
+                or len(self.by_id) != len(self.products) or len(previous.by_id) != len(previous.products)):
+            return Aggregates(self.products)
+        return self.diff.apply_to(previous.aggregates)
+
+    def __len__(self):
+        return len(self.products)
+
+
+class SnapshotStore:
+    """Holds the current snapshot and replaces it with a single atomic reference swap"""
+
+    def __init__(self, retain=RETAINED_SNAPSHOTS):
+        self._current = Snapshot(())
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._retain = retain
+        self._recent = OrderedDict([(0, self._current)])
+
+    @property
+    def current(self):
+        return self._current
+
+    def publish(self, products, last_updated=None, aggregates=None, version=None):
+        """Build a new snapshot off to the side and make it visible to readers in one step"""
+        with self._lock:
+            version = max(version or 0, self._current.version + 1)
+            snapshot = Snapshot(products, version, last_updated or datetime.now(), aggregates, previous=self._current)
+            self._current = snapshot
+            self._recent[snapshot.version] = snapshot
+            while len(self._recent) > self._retain:
+                self._recent.popitem(last=False)
+        diff = snapshot.diff
+        logger.info(f"Published snapshot v{snapshot.version} with {len(snapshot)} products "
+                    f"(+{len(diff.added)} ~{len(diff.changed)} -{len(diff.removed)})")
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Snapshot listener failed for v{snapshot.version}: {e}")
+        return snapshot
+
+    def get(self, version):
+        """A recently published snapshot by version, or None once it has been retired"""
+        return self._recent.get(version)
+
+    def subscribe(self, listener):
+        """Call listener(snapshot) after every publish"""
+        self._listeners.append(listener)
+
+
+class RefreshScheduler:
+    """Background thread that rebuilds the catalogue on an interval and on demand
+
+    loader(force=...) returns the new products or None to keep the current snapshot;
+    force is True for manually requested jobs.
+    """
+
+    def __init__(self, store, loader, interval=None):
+        self.store = store
+        self.loader = loader
+        self.interval = interval or None
+        self.jobs = OrderedDict()
+        self.pending = None
+        self.running = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start the refresher thread if it is not already running"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self._run, name='refresher', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def request_refresh(self, trigger='manual'):
+        """Enqueue a refresh and return its job, reusing the in-flight job if there is one"""
+        self.start()
+        with self.lock:
+            job = self._reusable_job(trigger)
+            if job is None:
+                job = self._new_job(trigger)
+                self.pending = job
+        self.wakeup.set()
+        return dict(job)
+
+    def _reusable_job(self, trigger):
+        """The job a new request can join; an import only joins one that has not read the imports yet"""
+        return (self.pending or self.running) if trigger == 'manual' else self.pending
+
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _new_job(self, trigger):
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': 'queued',
+            'trigger': trigger,
+            'requested_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'version': None,
+            'error': None
+        }
+        self.jobs[job['job_id']] = job
+        while len(self.jobs) > MAX_TRACKED_JOBS:
+            self.jobs.popitem(last=False)
+        return job
+
+    def _next_job(self):
+        """Take the pending job, or start a scheduled one, and mark it running"""
+        with self.lock:
+            job = self.pending or self._new_job('scheduled')
+            self.pending = None
+            self.running = job
+            job['status'] = 'running'
+            job['started_at'] = datetime.now().isoformat()
+        return job
+
+    def _refresh(self, job):
+        """Load and publish for one job, recording the outcome on it"""
+        try:
+            products = self.loader(force=job['trigger'] == 'manual')
+            snapshot = self.store.current if products is None else self.store.publish(products)
+            status, version, error = 'done', snapshot.version, None
+        except Exception as e:
+            logger.error(f"Background refresh failed, keeping snapshot v{self.store.current.version}: {e}")
+            status, version, error = 'failed', None, str(e)
+
+        with self.lock:
+            job['status'] = status
+            job['version'] = version
+            job['error'] = error
+            job['finished_at'] = datetime.now().isoformat()
+            self.running = None
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if self.stopping.is_set():
+                break
+            self._refresh(self._next_job())
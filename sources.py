@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from ingest import dedupe_products, ingest_products
+from parsers import LAYOUTS, parse_pages
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 3600
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class SourceAdapter:
+    """One scraped source: the pages to fetch, the layout that parses them and how often to check them
+
+    timeout overrides the engine-wide request timeout for this source; None uses the engine's.
+    """
+
+    def __init__(self, name, urls, parser, category, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 limit=5, timeout=None):
+        if parser not in LAYOUTS:
+            raise ValueError(f"Unknown parser for source {name}: {parser}")
+        self.name = name
+        self.urls = (urls,) if isinstance(urls, str) else tuple(urls)
+        self.parser = parser
+        self.category = category
+        self.refresh_interval = refresh_interval
+        self.limit = limit
+        self.timeout = timeout
+
+
+class SourceState:
+    """Validators and ingested products from the last successful fetch of each of a source's pages"""
+
+    def __init__(self):
+        self.validators = {}
+        self.pages = {}
+        self.checked_at = None
+        self.changed_at = None
+        self.failures = 0
+        self.fetches = 0
+        self.failures_total = 0
+        self.last_duration = None
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for a page we already hold"""
+        etag, last_modified = self.validators.get(url, (None, None))
+        headers = {}
+        if url in self.pages:
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers or None
+
+
+class SourceRegistry:
+    """Registered sources and what was last fetched from each, so a refresh only redoes what changed"""
+
+    def __init__(self):
+        self.adapters = OrderedDict()
+        self.states = {}
+        # lock guards the per-source state and is only held briefly; refresh_lock serializes refreshes
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def register(self, adapter):
+        """Add a source; products are merged in registration order"""
+        if adapter.name in self.adapters:
+            raise ValueError(f"Source already registered: {adapter.name}")
+        self.adapters[adapter.name] = adapter
+        self.states[adapter.name] = SourceState()
+        return adapter
+
+    def due(self, force=False, now=None):
+        """Sources whose refresh cadence has elapsed, or every source when forced"""
+        now = time.time() if now is None else now
+        return [
+            adapter for name, adapter in self.adapters.items()
+            if force or self.states[name].checked_at is None
+            or now - self.states[name].checked_at >= adapter.refresh_interval
+        ]
+
+    def refresh(self, engine, force=False, processes=0, parser='lxml'):
+        """Conditionally fetch due sources, re-ingest only pages that changed and return the changed source names
+
+        Refreshes are serialized by their own lock. The state lock is only held to read
+        validators and to commit results, never across fetching or parsing, so stats()
+        and products() stay cheap while a slow source is being scraped.
+        """
+        with self.refresh_lock:
+            started = time.time()
+            with self.lock:
+                requests = [
+                    {
+                        'adapter': adapter,
+                        'url': url,
+                        'timeout': adapter.timeout,
+                        'headers': self.states[adapter.name].conditional_headers(url)
+                    }
+                    for adapter in self.due(force, started)
+                    for url in adapter.urls
+                ]
+            if not requests:
+                return []
+
+            fetched = OrderedDict()
+            for request, response in engine.fetch_all(requests):
+                fetched.setdefault(request['adapter'].name, []).append((request, response))
+
+            fetched_ok = []
+            changed_pages = []
+            with self.lock:
+                for name, results in fetched.items():
+                    state = self.states[name]
+                    state.fetches += 1
+                    state.last_duration = max(request['elapsed'] for request, _ in results)
+                    if any(response is None for _, response in results):
+                        # Keep everything we had; the source is retried on the next tick
+                        state.failures += 1
+                        state.failures_total += 1
+                        logger.warning(f"Source {name} failed to fetch, keeping {self._count(state)} products")
+                        continue
+                    fetched_ok.append(name)
+                    changed_pages.extend(
+                        (request, response) for request, response in results if response.status_code != 304
+                    )
+
+            if not changed_pages:
+                self._commit(fetched_ok, started, [], [])
+                logger.info('No source changed since the last refresh')
+                return []
+
+            pages = [
+                (request['adapter'].parser, response.content, request['adapter'].category, request['adapter'].limit)
+                for request, response in changed_pages
+            ]
+            # Validators and checked_at are only committed with the parsed pages, so a failed
+            # parse leaves the old validators in place and the pages are refetched next tick
+            parsed = [ingest_products(products) for products in parse_pages(pages, processes=processes, parser=parser)]
+            changed = self._commit(fetched_ok, started, changed_pages, parsed)
+            logger.info(f"Re-ingested {len(changed_pages)} changed pages from: {', '.join(changed)}")
+            return changed
+
+    def _commit(self, names, started, changed_pages, parsed):
+        """Record a successful check of names and store the validators and products of their changed pages"""
+        changed = []
+        with self.lock:
+            for name in names:
+                self.states[name].checked_at = started
+                self.states[name].failures = 0
+            for (request, response), products in zip(changed_pages, parsed):
+                name = request['adapter'].name
+                state = self.states[name]
+                state.validators[request['url']] = (response.headers.get('ETag'),
+                                                    response.headers.get('Last-Modified'))
+                state.pages[request['url']] = products
+                state.changed_at = started
+                if name not in changed:
+                    changed.append(name)
+        return changed
+
+    def products(self):
+        """Merged products of every source, deduplicated by id; untouched products are reused as is"""
+        with self.lock:
+            return dedupe_products(
+                product
+                for name, adapter in self.adapters.items()
+                for url in adapter.urls
+                for product in self.states[name].pages.get(url, ())
+            )
+
+    def stats(self):
+        """Per-source freshness for health and monitoring endpoints"""
+        with self.lock:
+            return {
+                name: {
+                    'products': self._count(self.states[name]),
+                    'checked_at': _isoformat(self.states[name].checked_at),
+                    'changed_at': _isoformat(self.states[name].changed_at),
+                    'failures': self.states[name].failures,
+                    'failures_total': self.states[name].failures_total,
+                    'fetches': self.states[name].fetches,
+                    'last_duration': self.states[name].last_duration
+                }
+                for name in self.adapters
+            }
+
+    @staticmethod
+    def _count(state):
+        return sum(len(page) for page in state.pages.values())